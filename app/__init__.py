@@ -0,0 +1,7 @@
+import os
+
+# Load .env before any module reads its settings; skip importing dotenv when there is none
+_ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.exists(_ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE, override=False)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "600"))
+
+
+class AnswerCache:
+    """
+    Size- and TTL-bounded store of precomputed agent results keyed by singleflight.request_key.
+    Entries are single-use: `take` removes them and counts a hit. Entries dropped because the
+    caller computed the answer itself are counted as superseded, and entries that expire or are
+    evicted without ever being taken as wasted (each with the tokens spent producing them).
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl_s: float = ANSWER_CACHE_TTL_S):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple[float, Dict[str, Any], int]]" = OrderedDict()
+        self._stats = {"stored": 0, "hits": 0, "superseded": 0, "superseded_tokens": 0,
+                       "wasted": 0, "wasted_tokens": 0}
+
+    def _drop_oldest(self):
+        _, (_, _, tokens) = self._items.popitem(last=False)
+        self._stats["wasted"] += 1
+        self._stats["wasted_tokens"] += tokens
+
+    def _purge_expired(self, now: float):
+        # Same TTL for every entry, so insertion order is expiry order
+        while self._items and next(iter(self._items.values()))[0] <= now:
+            self._drop_oldest()
+
+    def put(self, key: str, result: Dict[str, Any], tokens: int = 0):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            if key in self._items:
+                self._items.pop(key)
+            self._items[key] = (now + self.ttl_s, result, tokens)
+            self._stats["stored"] += 1
+            while len(self._items) > self.max_size:
+                self._drop_oldest()
+
+    def take(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entry = self._items.pop(key, None)
+            if entry is None:
+                return None
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def discard(self, key: str) -> bool:
+        """Drop an entry made redundant by an answer the caller computed itself."""
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is None:
+                return False
+            self._stats["superseded"] += 1
+            self._stats["superseded_tokens"] += entry[2]
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            out = dict(self._stats)
+            out["size"] = len(self._items)
+        return out
+
+
+ANSWER_CACHE = AnswerCache()
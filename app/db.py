@@ -1,27 +1,362 @@
 from __future__ import annotations
+import itertools
+import logging
 import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from contextvars import ContextVar
 
 DB_PATH = os.getenv("DB_PATH", "./data.db")
+# Idle read-only connections kept open for reuse
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# file:   read the SQLite file directly (mode=ro)
+# memory: copy the file into one shared in-memory database per process at startup
+# mmap:   read the file through a shared memory map, so several workers share one copy of the pages
+DB_MODE = os.getenv("DB_MODE", "file").lower()
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(1024 * 1024 * 1024)))
+# How often to stat the file for changes (memory mode reloads the snapshot, all modes drop the schema cache)
+DB_RELOAD_CHECK_S = float(os.getenv("DB_RELOAD_CHECK_S", "5"))
+# Per-tenant databases live at TENANT_DB_DIR/<tenant_id>.db (tenant routing is off when unset)
+TENANT_DB_DIR = os.getenv("TENANT_DB_DIR")
+# Open tenant databases kept around (LRU), how long an unused one stays open, and its pool size
+TENANT_LRU_SIZE = int(os.getenv("TENANT_LRU_SIZE", "64"))
+TENANT_IDLE_S = float(os.getenv("TENANT_IDLE_S", "900"))
+TENANT_POOL_SIZE = int(os.getenv("TENANT_POOL_SIZE", "2"))
 
-# Use URI mode=ro to prevent writes
-URI = f"file:{os.path.abspath(DB_PATH)}?mode=ro"
+_LOGGER = logging.getLogger("uvicorn.error")
+_MEMDB_IDS = itertools.count(1)
+
+
+class DatabaseClosed(sqlite3.ProgrammingError):
+    """A closed Database (e.g. evicted from the tenant LRU) was asked for a new connection."""
+
+
+class Database:
+    """
+    A read-only SQLite source with its own connection pool and schema cache.
+    In memory mode the file is copied into a named shared-cache in-memory database;
+    when the file changes a new copy is built and swapped in atomically, and
+    connections to the old copy are closed as they come back to the pool.
+    """
+
+    def __init__(self, path: str, mode: str = DB_MODE, pool_size: int = DB_POOL_SIZE):
+        if mode not in ("file", "memory", "mmap"):
+            raise ValueError(f"unknown DB_MODE '{mode}'")
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self._pool: "queue.LifoQueue[tuple[int, sqlite3.Connection]]" = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._uri: str | None = None
+        self._anchor: sqlite3.Connection | None = None  # keeps the current in-memory copy alive
+        self._generation = 0
+        self._signature = None
+        self._next_check = 0.0
+        self._closed = False
+        # Schema lookups are hit on every agent run; the DB is read-only so cache them
+        self._schema: dict = {}
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        signature = self._file_signature()
+        file_uri = f"file:{self.path}?mode=ro"
+        anchor = None
+        if self.mode == "memory":
+            uri = f"file:kudwa_memdb_{next(_MEMDB_IDS)}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            src = sqlite3.connect(file_uri, uri=True)
+            try:
+                src.backup(anchor)
+            finally:
+                src.close()
+        else:
+            uri = file_uri
+
+        with self._lock:
+            if self._closed:
+                # closed while the copy was being made; don't leave it behind
+                if anchor is not None:
+                    anchor.close()
+                raise DatabaseClosed(f"database {self.path} is closed")
+            old_anchor = self._anchor
+            self._uri, self._anchor = uri, anchor
+            self._generation += 1
+            self._signature = signature
+            self._schema.clear()
+        self._drain_pool()
+        if old_anchor is not None:
+            # Connections still reading the old copy keep it alive until they close
+            old_anchor.close()
+
+    def _drain_pool(self):
+        while True:
+            try:
+                self._pool.get_nowait()[1].close()
+            except queue.Empty:
+                break
+
+    def _maybe_reload(self):
+        if self._closed:
+            raise DatabaseClosed(f"database {self.path} is closed")
+        now = time.monotonic()
+        if self._uri is not None and now < self._next_check:
+            return
+        # One thread checks/reloads; the others keep using the current copy meanwhile
+        if not self._reload_lock.acquire(blocking=self._uri is None):
+            return
+        try:
+            self._next_check = now + DB_RELOAD_CHECK_S
+            if self._uri is None:
+                self._load()
+                return
+            try:
+                changed = self._file_signature() != self._signature
+            except OSError:
+                changed = False  # file briefly missing while being replaced
+            if changed:
+                self._load()
+                _LOGGER.info("db: reloaded %s (mode=%s, generation=%s)", self.path, self.mode, self._generation)
+        finally:
+            self._reload_lock.release()
+
+    def _connect(self) -> tuple[int, sqlite3.Connection]:
+        with self._lock:
+            uri, generation = self._uri, self._generation
+        if uri is None:
+            raise DatabaseClosed(f"database {self.path} is closed")
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.mode == "memory":
+            conn.execute("PRAGMA query_only = ON")
+        elif self.mode == "mmap":
+            conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        return generation, conn
+
+    @contextmanager
+    def connection(self):
+        self._maybe_reload()
+        entry = None
+        while entry is None:
+            try:
+                entry = self._pool.get_nowait()
+            except queue.Empty:
+                entry = self._connect()
+            if entry[0] != self._generation:
+                entry[1].close()
+                entry = None
+        try:
+            yield entry[1]
+        finally:
+            if self._closed or entry[0] != self._generation:
+                entry[1].close()
+            else:
+                try:
+                    self._pool.put_nowait(entry)
+                except queue.Full:
+                    entry[1].close()
+
+    def cached(self, key, load):
+        with self._lock:
+            if key in self._schema:
+                return self._schema[key]
+            generation = self._generation
+        value = load()
+        with self._lock:
+            # Don't cache a result computed against a copy that was swapped out meanwhile
+            if generation == self._generation:
+                self._schema[key] = value
+        return value
+
+    def clear_caches(self):
+        with self._lock:
+            self._schema.clear()
+
+    def fill_pool(self, connections: int) -> int:
+        self._maybe_reload()
+        for _ in range(connections):
+            entry = self._connect()
+            try:
+                self._pool.put_nowait(entry)
+            except queue.Full:
+                entry[1].close()
+                break
+        return self._pool.qsize()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        # Connections already handed out finish their query; new ones raise DatabaseClosed
+        self._closed = True
+        self._drain_pool()
+        with self._lock:
+            anchor, self._anchor, self._uri = self._anchor, None, None
+            self._generation += 1
+            self._schema.clear()
+        if anchor is not None:
+            anchor.close()
+
+
+class UnknownTenant(LookupError):
+    pass
+
+
+class TenantRegistry:
+    """
+    Size-bounded LRU of open tenant databases. Evicted or idle databases are closed;
+    connections still in use finish their query and are closed when handed back.
+    """
+
+    _ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+    def __init__(self, root: str | None = TENANT_DB_DIR, max_open: int = TENANT_LRU_SIZE,
+                 idle_s: float = TENANT_IDLE_S):
+        self.root = os.path.abspath(root) if root else None
+        self.max_open = max(max_open, 1)
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, tuple[Database, float]]" = OrderedDict()
+        self._next_sweep = 0.0
+        self._stats = {"opened": 0, "evicted": 0, "idle_closed": 0}
+
+    def path_for(self, tenant_id: str) -> str:
+        if not self.root:
+            raise UnknownTenant("tenant routing is not enabled (set TENANT_DB_DIR)")
+        if not self._ID_RE.match(tenant_id or ""):
+            raise UnknownTenant(f"invalid tenant id '{tenant_id}'")
+        path = os.path.join(self.root, f"{tenant_id}.db")
+        if not os.path.isfile(path):
+            raise UnknownTenant(f"unknown tenant '{tenant_id}'")
+        return path
+
+    def get(self, tenant_id: str) -> Database:
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            entry = self._open.get(tenant_id)
+            if entry is None:
+                database = Database(self.path_for(tenant_id), pool_size=TENANT_POOL_SIZE)
+                self._stats["opened"] += 1
+            else:
+                database = entry[0]
+            self._open[tenant_id] = (database, now)
+            self._open.move_to_end(tenant_id)
+            while len(self._open) > self.max_open:
+                _, (old, _) = self._open.popitem(last=False)
+                to_close.append(old)
+                self._stats["evicted"] += 1
+            if now >= self._next_sweep:
+                self._next_sweep = now + min(self.idle_s, 60.0)
+                for tid, (old, last_used) in list(self._open.items()):
+                    if tid != tenant_id and now - last_used > self.idle_s:
+                        del self._open[tid]
+                        to_close.append(old)
+                        self._stats["idle_closed"] += 1
+        for old in to_close:
+            old.close()
+        return database
+
+    def close_all(self):
+        with self._lock:
+            databases = [d for d, _ in self._open.values()]
+            self._open.clear()
+        for database in databases:
+            database.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["open"] = len(self._open)
+        return out
+
+
+TENANTS = TenantRegistry()
+_CURRENT_TENANT: ContextVar[str | None] = ContextVar("tenant_id", default=None)
+
+_DEFAULT_DB: Database | None = None
+_DEFAULT_LOCK = threading.Lock()
+
+def resolve_tenant(tenant_id: str | None) -> str | None:
+    """Validate a tenant id (raising UnknownTenant) so callers can reject it before doing any work."""
+    if tenant_id:
+        TENANTS.path_for(tenant_id)
+    return tenant_id or None
 
 @contextmanager
-def ro_conn():
-    conn = sqlite3.connect(URI, uri=True, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+def use_tenant(tenant_id: str | None):
+    """Route DB access in the current thread/task to `tenant_id`'s database (None = DB_PATH)."""
+    token = _CURRENT_TENANT.set(tenant_id or None)
     try:
-        yield conn
+        yield
     finally:
-        conn.close()
+        _CURRENT_TENANT.reset(token)
+
+def get_database() -> Database:
+    tenant_id = _CURRENT_TENANT.get()
+    if tenant_id:
+        return TENANTS.get(tenant_id)
+    global _DEFAULT_DB
+    if _DEFAULT_DB is None:
+        with _DEFAULT_LOCK:
+            if _DEFAULT_DB is None:
+                _DEFAULT_DB = Database(DB_PATH)
+    return _DEFAULT_DB
+
+@contextmanager
+def ro_conn():
+    database = get_database()
+    if database.closed:
+        # evicted from the tenant LRU between lookup and use; the registry reopens it
+        database = get_database()
+    with database.connection() as conn:
+        yield conn
+
+def _cached(key, load):
+    return get_database().cached(key, load)
+
+def clear_caches():
+    get_database().clear_caches()
+
+def warmup(connections: int = DB_POOL_SIZE) -> dict:
+    """
+    Pre-open pooled connections (loading the in-memory copy in memory mode), load the
+    schema cache and read every table once so the first request finds the pages cached.
+    """
+    database = get_database()
+    pool = database.fill_pool(connections)
+
+    names = list_tables()
+    for name in names:
+        describe_table(name)
+    row_counts = {}
+    with ro_conn() as c:
+        for name in list_tables(include_views=False):
+            safe_name = name.replace('"', '""')
+            row_counts[name] = c.execute(f'SELECT COUNT(*) FROM "{safe_name}"').fetchone()[0]
+    return {"mode": database.mode, "pool": pool, "relations": len(names), "rows": row_counts}
 
 def list_tables(
     include_views: bool = True,
     include_tables: bool = True,
     only: list[str] | None = None
 ):
+    names = _cached(("tables", include_views, include_tables),
+                    lambda: _list_tables(include_views, include_tables))
+    if only:
+        only_set = set(only)
+        names = [n for n in names if n in only_set]
+    return list(names)
+
+def _list_tables(include_views: bool, include_tables: bool):
     with ro_conn() as c:
         types = []
         if include_tables:
@@ -42,11 +377,7 @@ def list_tables(
             ORDER BY CASE type WHEN 'view' THEN 0 ELSE 1 END, name
         """).fetchall()
 
-        names = [r["name"] for r in rows]
-        if only:
-            only_set = set(only)
-            names = [n for n in names if n in only_set]
-        return names
+        return [r["name"] for r in rows]
 
 
 def describe_table(table: str):
@@ -54,6 +385,9 @@ def describe_table(table: str):
     Works for both tables and views.
     Tries PRAGMA first; if empty (some views), falls back to a 0-row SELECT to read column names.
     """
+    return [dict(col) for col in _cached(("describe", table), lambda: _describe_table(table))]
+
+def _describe_table(table: str):
     # Escape quotes safely for SQLite identifiers
     safe_name = table.replace('"', '""')
 
@@ -89,6 +423,69 @@ def describe_table(table: str):
             for i, d in enumerate(desc)
         ]
 
+def database_for(tenant_id: str | None) -> Database:
+    """The Database a request for `tenant_id` reads, for work that outlives use_tenant (e.g. streaming)."""
+    with use_tenant(tenant_id):
+        return get_database()
+
+_SQL_COMMENT_OR_STRING_RE = re.compile(r"--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'", re.DOTALL)
+_SQL_IDENTIFIER_RE = re.compile(r'"((?:[^"]|"")+)"|`([^`]+)`|\[([^\]]+)\]|([A-Za-z_][\w$]*)')
+
+def _named_relations(sql: str, names: set[str]) -> set[str]:
+    """Which of `names` (relation names, lowercase) appear as identifiers in `sql`."""
+    found = set()
+    for m in _SQL_IDENTIFIER_RE.finditer(_SQL_COMMENT_OR_STRING_RE.sub(" ", sql)):
+        ident = next(g for g in m.groups() if g is not None).replace('""', '"').lower()
+        if ident in names:
+            found.add(ident)
+    return found
+
+def _read_only_from(relations: set[str]):
+    # Reads through a view report the view as the 4th argument. A flattened view (e.g. the
+    # star-schema `data` view) can also read a table it joins with an empty column name and no
+    # view; that is allowed only for tables already read through an allowed view. Queries that
+    # name such a table themselves are rejected before this runs (stream_select)
+    via_views: set[str] = set()
+
+    def authorize(action, arg1, arg2, db_name, source):
+        if action != sqlite3.SQLITE_READ or arg1 in relations:
+            return sqlite3.SQLITE_OK
+        if source in relations:
+            via_views.add(arg1)
+            return sqlite3.SQLITE_OK
+        if not arg2 and arg1 in via_views:
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+    return authorize
+
+def stream_select(sql: str, params: dict | None = None, batch_size: int = 500,
+                  database: Database | None = None, allowed_relations: set[str] | None = None):
+    """
+    Yield (columns, rows) batches straight from the cursor via fetchmany, holding one pooled
+    connection for the duration. With `allowed_relations`, naming or reading anything else is denied.
+    """
+    database = database or get_database()
+    with database.connection() as c:
+        if allowed_relations is not None:
+            allowed = {r.lower() for r in allowed_relations}
+            others = {r[0].lower() for r in c.execute(
+                "SELECT name FROM sqlite_schema WHERE type IN ('table', 'view')")} - allowed
+            named = _named_relations(sql, others)
+            if named:
+                raise sqlite3.DatabaseError(f"access to {', '.join(sorted(named))} is prohibited")
+            c.set_authorizer(_read_only_from(allowed_relations))
+        try:
+            cur = c.execute(sql, params or {})
+            cols = [d[0] for d in cur.description]
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield cols, rows
+        finally:
+            if allowed_relations is not None:
+                c.set_authorizer(None)
+
 def run_select(sql: str, params: dict | None = None, max_rows: int = 1000):
     with ro_conn() as c:
         cur = c.execute(sql, params or {})
@@ -96,3 +493,51 @@ def run_select(sql: str, params: dict | None = None, max_rows: int = 1000):
         rows = cur.fetchmany(max_rows)
         data = [dict(zip(cols, r)) for r in rows]
         return {"columns": cols, "rows": data}
+
+# Built at ingest by db_setup_module/data_manager.index_accounts
+ACCOUNT_SEARCH_TABLE = "account_search"
+_SEARCH_WORD_RE = re.compile(r"[^\W_]+")
+
+def _account_list() -> list[dict]:
+    # One row per account/category/source with its searchable text, loaded once per DB generation
+    def load():
+        if ACCOUNT_SEARCH_TABLE in list_tables(include_views=False):
+            sql = f"SELECT account, account_ids, category, source, terms FROM {ACCOUNT_SEARCH_TABLE}"
+        else:
+            sql = """
+                SELECT account, GROUP_CONCAT(DISTINCT account_id) AS account_ids, LOWER(category) AS category,
+                       source, NULL AS terms
+                FROM data WHERE account IS NOT NULL GROUP BY account, LOWER(category), source"""
+        with ro_conn() as c:
+            rows = [dict(r) for r in c.execute(sql)]
+        for r in rows:
+            r["_text"] = " ".join(filter(None, (r["account"].replace("_", " ").lower(), (r.pop("terms") or "").lower())))
+        return rows
+    return _cached(("account_list",), load)
+
+def _match_words(query: str, limit: int) -> list[dict]:
+    """Accounts whose name (or search terms) contain every word of `query`; name-prefix matches first, then shortest."""
+    words = _SEARCH_WORD_RE.findall(query.lower())
+    if not words:
+        return []
+    first = words[0]
+    hits = [r for r in _account_list() if all(w in r["_text"] for w in words)]
+    hits.sort(key=lambda r: (not r["account"].lower().startswith(first), len(r["account"]), r["account"]))
+    return [{k: v for k, v in r.items() if k != "_text"} for r in hits[:limit]]
+
+def search_accounts(query: str, limit: int = 10) -> list[dict]:
+    """
+    Accounts best matching `query`, best first, via the account_search FTS5 trigram index over
+    account names, aliases and Rootfi subcategory paths. Queries without a word of 3+ characters
+    (shorter than a trigram), or databases without the index, fall back to matching every word
+    of the query against the (cached) account list.
+    """
+    words = [w for w in _SEARCH_WORD_RE.findall(query.lower()) if len(w) >= 3]
+    if not (words and ACCOUNT_SEARCH_TABLE in list_tables(include_views=False)):
+        return _match_words(query, limit)
+    sql = f"""
+        SELECT account, account_ids, category, source FROM {ACCOUNT_SEARCH_TABLE}
+        WHERE {ACCOUNT_SEARCH_TABLE} MATCH :q
+        ORDER BY bm25({ACCOUNT_SEARCH_TABLE}, 2.0, 1.0) LIMIT :lim"""
+    params = {"q": " OR ".join(f'"{w}"' for w in words), "lim": limit}
+    return run_select(sql, params, max_rows=limit)["rows"]
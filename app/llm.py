@@ -1,21 +1,43 @@
 from __future__ import annotations
 import os, json, re, logging
+import threading
 from typing import Dict, Any, List, Optional, Set
-from openai import OpenAI
 from datetime import datetime
 from uuid import uuid4
 from .prompts import SYSTEM
-from .tools import tool_schemas, tool_list_tables, tool_describe_table, tool_run_sql,tool_sample_rows, tool_distinct_values
-
-from dotenv import load_dotenv
-load_dotenv(override=False)
+from .scheduler import SCHEDULER, PRIORITY_INTERACTIVE
+from .db import use_tenant
+from .profiler import active as active_profile, phase, profile_path
+from .tools import tool_schemas, tool_list_tables, tool_describe_table, tool_run_sql,tool_sample_rows, tool_distinct_values, tool_search_accounts
 
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 LOG_LLM = os.getenv("LOG_LLM", "0") == "1"
 LOG_FILE = os.getenv("LLM_LOG_FILE")
 API_KEY = os.getenv("OPENAI_API_KEY")
-assert API_KEY, "OPENAI_API_KEY not found"
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Consecutive rounds of only-repeated tool calls before run_agent stops and forces an answer
+LOOP_STOP_AFTER = int(os.getenv("AGENT_LOOP_STOP_AFTER", "2"))
+# Output allowance added to the prompt size when reserving tokens-per-minute budget
+EST_OUTPUT_TOKENS = int(os.getenv("OPENAI_EST_OUTPUT_TOKENS", "600"))
+
+# Built on first use: importing openai is a large share of cold start
+client = None
+_CLIENT_LOCK = threading.Lock()
+
+def get_client():
+    global client
+    if client is None:
+        with _CLIENT_LOCK:
+            if client is None:
+                if not API_KEY:
+                    raise RuntimeError("OPENAI_API_KEY not found")
+                from openai import OpenAI
+                # Retries are handled by the scheduler so they respect the shared rate limits
+                client = OpenAI(api_key=API_KEY, max_retries=0)
+    return client
+
+def warm_model_connection(timeout: float = 5.0):
+    """Open (and keep alive) the HTTPS connection to the model endpoint."""
+    get_client().with_options(timeout=timeout, max_retries=0).models.retrieve(MODEL)
 
 def _setup_logger() -> logging.Logger:
     logger = logging.getLogger("llm")
@@ -60,6 +82,7 @@ TOOL_IMPL = {
     "tool_sample_rows": lambda args: tool_sample_rows(args["table_name"], args.get("limit", 5)),
     "tool_distinct_values": lambda args: tool_distinct_values(args["table_name"], args["column"],
                                                               args.get("limit", 100)),
+    "tool_search_accounts": lambda args: tool_search_accounts(args["query"], args.get("limit", 10)),
 }
 
 _SQL_TABLE_RE = re.compile(r"\b(?:from|join)\s+([\"`\[]?)([A-Za-z_][\w\.$]*?)\1\b", re.IGNORECASE)
@@ -107,7 +130,24 @@ def _extract_text(resp) -> str:
         pass
     return "".join(parts).strip()
 
-def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = None) -> Dict[str, Any]:
+def _estimate_tokens(cur_input) -> int:
+    # ~4 characters per token is close enough for reserving rate-limit budget
+    return len(json.dumps(cur_input, default=str)) // 4 + EST_OUTPUT_TOKENS
+
+def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = None,
+              schema: Dict[str, Any] | None = None, priority: int = PRIORITY_INTERACTIVE,
+              tenant_id: str | None = None) -> Dict[str, Any]:
+    """
+    schema: optional output of tools.discover_schema(); when given it is handed to the
+    model up front and tool_list_tables/tool_describe_table are answered from it.
+    priority: scheduler priority of this run's model calls (see app.scheduler).
+    tenant_id: run every tool against this tenant's database instead of DB_PATH.
+    """
+    with use_tenant(tenant_id):
+        return _run_agent(messages, context, schema, priority)
+
+def _run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None,
+               schema: Dict[str, Any] | None, priority: int) -> Dict[str, Any]:
     trace_id = str(uuid4())
     now = datetime.now()
     context = context or {}
@@ -125,21 +165,39 @@ def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = N
         )
     }
 
-    base_input = [{"role": "system", "content": SYSTEM}, dev_msg, *messages]
+    base_input = [{"role": "system", "content": SYSTEM}, dev_msg]
+    if schema:
+        base_input.append({
+            "role": "developer",
+            "content": (
+                "Schema already discovered (tool_list_tables and tool_describe_table results); "
+                "no need to call those tools again: " + json.dumps(schema)
+            )
+        })
+    base_input.extend(messages)
 
     used_tables: Set[str] = set()
     total_in = total_out = total_total = 0
 
-    _log_event("agent_start", trace_id=trace_id, model=MODEL, context=context)
-
-    def call_model(cur_input, round_no: int):
-        resp = client.responses.create(
-            model=MODEL,
-            input=cur_input,
-            tools=tool_schemas,
-            tool_choice="auto",
-            temperature=0.2,
-        )
+    _log_event("agent_start", trace_id=trace_id, model=MODEL, context=context,
+               profile=profile_path(trace_id) if active_profile() else None)
+
+    def call_model(cur_input, round_no: int, tool_choice: str = "auto"):
+        with phase("json"):
+            est_tokens = _estimate_tokens(cur_input)
+        with phase("model_wait"):
+            resp = SCHEDULER.call(
+                lambda: get_client().responses.create(
+                    model=MODEL,
+                    input=cur_input,
+                    tools=tool_schemas,
+                    tool_choice=tool_choice,
+                    temperature=0.2,
+                ),
+                priority=priority,
+                est_tokens=est_tokens,
+                tokens_used=lambda r: (_usage_dict(r) or {}).get("total_tokens"),
+            )
         _log("responses.create", resp.model_dump())
         u = _usage_dict(resp)
         if u:
@@ -191,6 +249,16 @@ def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = N
 
     # Up to N tool rounds
     MAX_ROUNDS = 5
+    # Tool outputs by (name, canonical args) for this trace; identical calls are answered from here
+    memo: Dict[tuple, str] = {}
+    if schema:
+        memo[("tool_list_tables", "{}")] = json.dumps(schema["tables"])
+        for tname, described in schema["describe"].items():
+            memo[("tool_describe_table", json.dumps({"table_name": tname}))] = json.dumps(described)
+    # Keys this trace has itself issued; pre-seeded schema entries are not repeats
+    issued: Set[tuple] = set()
+    transcript: List[Dict[str, Any]] = []
+    stalled_rounds = 0
     cur_input = list(base_input)
     final_resp = None
 
@@ -216,11 +284,13 @@ def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = N
 
         # Execute calls and build outputs
         func_outputs = []
+        repeated = 0
         for fc in func_calls:
             name = fc["name"]
             args_json = fc["arguments"] or "{}"
             try:
-                args = json.loads(args_json)
+                with phase("json"):
+                    args = json.loads(args_json)
             except Exception:
                 args = {}
 
@@ -231,49 +301,89 @@ def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = N
                     used_tables.add(tname)
                 _log_event("tool_call", trace_id=trace_id, tool=name, args=args)
 
-            try:
-                if name == "tool_run_sql":
-                    sql = args.get("sql", "") or ""
-                    params = args.get("named_params") or args.get("parameters") or {}
-                    params = _merge_context_params(sql, params)
-
-                    # table discovery from SQL
-                    sql_tables = _tables_from_sql(sql)
-                    for t in sql_tables:
-                        used_tables.add(t)
-
-                    # log the query + params + tables
-                    _log_event(
-                        "sql_exec",
-                        trace_id=trace_id,
-                        sql=sql,
-                        params=params,
-                        tables=sql_tables
-                    )
-
-                    result = TOOL_IMPL["tool_run_sql"]({"sql": sql, "named_params": params})
-                    # tiny result summary to avoid huge logs
-                    rows = (len(result) if isinstance(result, list) else 1) if result is not None else 0
-                    _log_event("sql_result", trace_id=trace_id, approx_rows=rows)
+            if name == "tool_run_sql":
+                sql = args.get("sql", "") or ""
+                params = args.get("named_params") or args.get("parameters") or {}
+                params = _merge_context_params(sql, params)
+                memo_key = (name, json.dumps({"sql": " ".join(sql.split()), "named_params": params},
+                                             sort_keys=True, default=str))
+            else:
+                memo_key = (name, json.dumps(args, sort_keys=True, default=str))
+
+            if memo_key in issued:
+                repeated += 1
+            issued.add(memo_key)
+            output = memo.get(memo_key)
+            if output is not None:
+                _log_event("tool_memo_hit", trace_id=trace_id, tool=name, args=args)
+            else:
+                try:
+                    if name == "tool_run_sql":
+                        # table discovery from SQL
+                        sql_tables = _tables_from_sql(sql)
+                        for t in sql_tables:
+                            used_tables.add(t)
+
+                        # log the query + params + tables
+                        _log_event(
+                            "sql_exec",
+                            trace_id=trace_id,
+                            sql=sql,
+                            params=params,
+                            tables=sql_tables
+                        )
+
+                        with phase("tool_exec"):
+                            result = TOOL_IMPL["tool_run_sql"]({"sql": sql, "named_params": params})
+                        # tiny result summary to avoid huge logs
+                        rows = (len(result) if isinstance(result, list) else 1) if result is not None else 0
+                        _log_event("sql_result", trace_id=trace_id, approx_rows=rows)
+
+                    else:
+                        impl = TOOL_IMPL.get(name)
+                        with phase("tool_exec"):
+                            result = impl(args) if impl else {"error": f"unknown tool '{name}'"}
+
+                except Exception as e:
+                    result = {"error": str(e)}
+                    _log_event("tool_error", trace_id=trace_id, tool=name, error=str(e))
+
+                with phase("json"):
+                    output = json.dumps(result)
+                memo[memo_key] = output
 
+            func_outputs.append({
+                "type": "function_call_output",
+                "call_id": fc["call_id"],            # MUST match
+                "output": output,                    # STRING
+            })
 
-                else:
-                    impl = TOOL_IMPL.get(name)
-                    result = impl(args) if impl else {"error": f"unknown tool '{name}'"}
+        # Carry every round's calls and outputs forward so the model sees what it already has
+        transcript.extend(func_calls + func_outputs)
 
-            except Exception as e:
-                result = {"error": str(e)}
-                _log_event("tool_error", trace_id=trace_id, tool=name, error=str(e))
+        # A round made only of calls it already made means the model is looping
+        if repeated == len(func_calls):
+            stalled_rounds += 1
+            _log_event("tool_loop", trace_id=trace_id, round=round_no, stalled_rounds=stalled_rounds)
+        else:
+            stalled_rounds = 0
 
+        if stalled_rounds >= LOOP_STOP_AFTER or round_no == MAX_ROUNDS:
+            # Stop early: one last call with tools disabled to get the answer from what we have
+            final_resp = call_model(list(base_input) + transcript, round_no + 1, tool_choice="none")
+            break
 
-            func_outputs.append({
-                "type": "function_call_output",
-                "call_id": fc["call_id"],            # MUST match
-                "output": json.dumps(result),        # STRING
+        if stalled_rounds:
+            transcript.append({
+                "role": "developer",
+                "content": (
+                    "You already made these exact tool calls; their results are above. "
+                    "Do not repeat them. Use the results you have, or answer now."
+                ),
             })
 
-        # Prepare next-round input by appending both the calls and their outputs
-        cur_input = list(base_input) + func_calls + func_outputs
+        # Prepare next-round input
+        cur_input = list(base_input) + transcript
 
     # Final usage roll-up
     if total_in or total_out or total_total:
@@ -285,7 +395,8 @@ def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = N
 
     # Parse your JSON envelope if present
     try:
-        result = json.loads(text)
+        with phase("json"):
+            result = json.loads(text)
     except Exception:
         result = {"answer": text}
         # Final audit summary
@@ -299,4 +410,6 @@ def run_agent(messages: List[Dict[str, str]], context: Dict[str, Any] | None = N
         "answer": result.get("answer", text or "(no answer)"),
         "table_preview": result.get("table_preview"),
         "followups": result.get("followups", []),
+        "usage": {"input": total_in, "output": total_out, "total": total_total},
+        "trace_id": trace_id,
     }
\ No newline at end of file
@@ -1,10 +1,44 @@
 from __future__ import annotations
+import asyncio
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import chat
+from app import db, llm
+from app.routers import chat, data
 
-app = FastAPI(title="Kudwa Chatbot API", version="0.1.0")
+# Warm the DB pool, schema cache and model connection before serving traffic
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+_LOGGER = logging.getLogger("uvicorn.error")
+
+def warmup() -> dict:
+    report = {}
+    t0 = time.perf_counter()
+    try:
+        report["db"] = db.warmup()
+    except Exception as e:
+        report["db_error"] = str(e)
+    t1 = time.perf_counter()
+    try:
+        llm.warm_model_connection()
+    except Exception as e:
+        # not fatal: the first request simply pays for the handshake
+        report["model_error"] = str(e)
+    t2 = time.perf_counter()
+    report["db_ms"] = round((t1 - t0) * 1000, 1)
+    report["model_ms"] = round((t2 - t1) * 1000, 1)
+    return report
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        _LOGGER.info("warmup: %s", await asyncio.to_thread(warmup))
+    yield
+
+app = FastAPI(title="Kudwa Chatbot API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +53,7 @@ def health():
     return {"ok": True}
 
 app.include_router(chat.router)
+app.include_router(data.router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -27,4 +62,4 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=int(os.getenv("PORT", 8000)),
         reload=True
-    )
\ No newline at end of file
+    )
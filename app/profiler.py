@@ -0,0 +1,137 @@
+from __future__ import annotations
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Off unless enabled here; a request then opts in with `X-Profile: 1` or context {"profile": true}
+PROFILE_ENABLED = os.getenv("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./logs/profiles")
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+PHASES = ("model_wait", "tool_exec", "json", "pydantic")
+
+_CURRENT: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Attribute the wall time of the block to `name` in the active request profile, if any."""
+    profile = _CURRENT.get()
+    if profile is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - t0)
+
+
+def active() -> Optional["RequestProfile"]:
+    return _CURRENT.get()
+
+
+def profile_path(trace_id: str, directory: str = PROFILE_DIR) -> str:
+    return os.path.join(directory, trace_id)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """
+    Samples the stack of the thread that started it every PROFILE_INTERVAL_S and times the
+    phases marked with `phase()`. Used as a context manager around one request's work.
+    """
+
+    def __init__(self, interval_s: float = PROFILE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.phases: Dict[str, float] = {p: 0.0 for p in PHASES}
+        self.stacks: Counter = Counter()
+        self.wall_s = 0.0
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._token = None
+        self._t0 = 0.0
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def _sample(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                if frame.f_code.co_filename != __file__:
+                    stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self) -> "RequestProfile":
+        self._token = _CURRENT.set(self)
+        self._t0 = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._t0
+        self._stop.set()
+        self._sampler.join()
+        _CURRENT.reset(self._token)
+        return False
+
+    def summary(self) -> Dict[str, Any]:
+        wall_ms = self.wall_s * 1000
+        phases = {name: round(s * 1000, 1) for name, s in self.phases.items()}
+        phases["other"] = round(max(wall_ms - sum(phases.values()), 0.0), 1)
+        return {"wall_ms": round(wall_ms, 1), "phases_ms": phases,
+                "samples": sum(self.stacks.values()), "interval_ms": self.interval_s * 1000}
+
+    def report(self, trace_id: str, top: int = 25) -> str:
+        summary = self.summary()
+        wall = summary["wall_ms"] or 1.0
+        lines = [f"trace_id: {trace_id}", f"wall: {summary['wall_ms']:.1f} ms", "", "phase            ms       %"]
+        for name, ms in summary["phases_ms"].items():
+            lines.append(f"{name:<12}{ms:>10.1f}{ms / wall * 100:>8.1f}")
+
+        total = summary["samples"] or 1
+        inclusive: Counter = Counter()
+        leaf: Counter = Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            leaf[frames[-1]] += n
+            for f in set(frames):
+                inclusive[f] += n
+        lines += ["", f"samples: {summary['samples']} every {summary['interval_ms']:g} ms", "",
+                  "top functions by own samples:"]
+        lines += [f"{n / total * 100:>6.1f}%  {f}" for f, n in leaf.most_common(top)]
+        lines += ["", "top functions by inclusive samples:"]
+        lines += [f"{n / total * 100:>6.1f}%  {f}" for f, n in inclusive.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+    def save(self, trace_id: str, directory: str = PROFILE_DIR) -> str:
+        """
+        Write report.txt, summary.json and stacks.collapsed (folded stacks, the input format of
+        flamegraph.pl and speedscope) to <directory>/<trace_id>/ and return that path.
+        """
+        out = profile_path(trace_id, directory)
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, "report.txt"), "w", encoding="utf-8") as f:
+            f.write(self.report(trace_id))
+        with open(os.path.join(out, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump({"trace_id": trace_id, **self.summary()}, f, indent=2)
+        with open(os.path.join(out, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        return out
@@ -35,6 +35,7 @@ Rules:
 - Always use general business rules for questions on profit/net income
 - Always name bindings exactly as :year and :quarter (lowercase). Do not use aliases like :Year, :yr, :q, or :qtr.
 - Before filtering by a categorical value, if unsure, call tool_distinct_values('data','category'). Otherwise use the canonical mapping.
+- To find which account(s) the user means (e.g. "payroll", "office rent"), call tool_search_accounts with their wording and filter on the returned exact account values. Do not list all accounts with tool_distinct_values.
 - When using tool_run_sql, always supply a named_params dict with all bindings for :param placeholders in the SQL. Example: {"sql": "... WHERE year = :year", "named_params": {"year": 2023}}.
 
 Output:
@@ -1,27 +1,135 @@
 from __future__ import annotations
-from fastapi import APIRouter, HTTPException
-from app.schemas import ChatRequest, ChatResponse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException
+from fastapi.responses import JSONResponse
+from app.schemas import ChatRequest, ChatResponse, BatchChatRequest, BatchChatResponse, BatchChatItem
 from app.storage import add_message, get_history
 from app.llm import run_agent
+from app.tools import discover_schema
+from app.singleflight import CHAT_FLIGHT, COALESCE_ENABLED, request_key
+from app.answer_cache import ANSWER_CACHE
+from app.speculation import SPECULATOR, SPECULATE_ENABLED
+from app.scheduler import SCHEDULER, PRIORITY_BATCH, Overloaded
+from app.db import TENANTS, UnknownTenant, resolve_tenant, use_tenant
+from app.profiler import PROFILE_ENABLED, RequestProfile, phase, profile_path
+
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+def _tenant_of(req) -> str | None:
+    tenant_id = req.tenant_id or (req.context or {}).get("tenant_id")
+    try:
+        return resolve_tenant(str(tenant_id) if tenant_id else None)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.post("", response_model=ChatResponse)
-def chat(req: ChatRequest):
+def chat(req: ChatRequest, background_tasks: BackgroundTasks, x_profile: str | None = Header(None)):
+    context = dict(req.context or {})
+    profiled = bool(context.pop("profile", False)) or x_profile == "1"
+    if not (PROFILE_ENABLED and profiled):
+        return _chat(req, context, background_tasks)
+
+    # Profile the real work: skip the answer cache and coalescing
+    with RequestProfile() as profile:
+        response = _chat(req, context, background_tasks, shared=False)
+        if response.trace_id:
+            # Relative to PROFILE_DIR; the server's filesystem layout stays private
+            response.profile = profile_path(response.trace_id, "")
+        # What FastAPI would do with the returned model (response_model validation, then
+        # rendering the body), done here so both are inside the profile
+        with phase("pydantic"):
+            content = ChatResponse.model_validate(response.model_dump()).model_dump(mode="json")
+        with phase("json"):
+            rendered = JSONResponse(content)
+    if response.trace_id:
+        profile.save(response.trace_id)
+    return rendered
+
+def _chat(req: ChatRequest, context: dict, background_tasks: BackgroundTasks, shared: bool = True) -> ChatResponse:
+    tenant_id = _tenant_of(req)
     # Build dialogue: keep short history for context-aware followups
-    history = get_history(req.session_id)
-    history = history + [{"role": "user", "content": req.message}]
+    prior = get_history(req.session_id, tenant_id)
+    history = prior + [{"role": "user", "content": req.message}]
+    key = request_key(req.message, context, prior, tenant_id)
+
+    # run_agent adds date keys to the context it gets, so hand it a copy
+    def execute():
+        return run_agent(history, context=dict(context), tenant_id=tenant_id)
+
+    # A followup answered speculatively is served straight from the answer cache
+    result = ANSWER_CACHE.take(key) if shared else None
+    if result is None:
+        try:
+            if COALESCE_ENABLED and shared:
+                # Identical concurrent questions share one agent run
+                result = CHAT_FLIGHT.do(key, execute)
+                # A speculative run of the same question that finished meanwhile is now redundant
+                ANSWER_CACHE.discard(key)
+            else:
+                result = execute()
+        except Overloaded as e:
+            # Shed load fast instead of queueing past the deadline
+            raise HTTPException(status_code=503, detail=str(e),
+                                headers={"Retry-After": str(int(e.retry_after + 0.999))})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    # Log turn
+    add_message(req.session_id, "user", req.message, tenant_id)
+    add_message(req.session_id, "assistant", result.get("answer", ""), tenant_id)
+
+    if SPECULATE_ENABLED and result.get("followups"):
+        # Runs after the response is sent
+        background_tasks.add_task(SPECULATOR.schedule, req.session_id, result["followups"], context, tenant_id)
+
+    with phase("pydantic"):
+        return ChatResponse(
+            answer=result.get("answer", ""),
+            table_preview=result.get("table_preview"),
+            followups=result.get("followups", []),
+            trace_id=result.get("trace_id"),
+        )
+
+@router.post("/batch", response_model=BatchChatResponse)
+def chat_batch(req: BatchChatRequest):
+    started = time.perf_counter()
+    tenant_id = _tenant_of(req)
     try:
-        result = run_agent(history, context=req.context or {})
+        # One schema discovery shared by every question in the batch
+        with use_tenant(tenant_id):
+            schema = discover_schema()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    # Log turn
-    add_message(req.session_id, "user", req.message)
-    add_message(req.session_id, "assistant", result.get("answer", ""))
-
-    return ChatResponse(
-        answer=result.get("answer", ""),
-        table_preview=result.get("table_preview"),
-        followups=result.get("followups", []),
-    )
+    def answer(index: int, question: str) -> BatchChatItem:
+        t0 = time.perf_counter()
+        try:
+            result = run_agent([{"role": "user", "content": question}],
+                               context=dict(req.context or {}), schema=schema, priority=PRIORITY_BATCH,
+                               tenant_id=tenant_id)
+            return BatchChatItem(
+                index=index,
+                question=question,
+                answer=result.get("answer", ""),
+                table_preview=result.get("table_preview"),
+                followups=result.get("followups", []),
+                elapsed_ms=round((time.perf_counter() - t0) * 1000, 1),
+            )
+        except Exception as e:
+            return BatchChatItem(index=index, question=question, error=str(e),
+                                 elapsed_ms=round((time.perf_counter() - t0) * 1000, 1))
+
+    parallel = min(req.max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL, len(req.questions))
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="chat-batch") as pool:
+        items = list(pool.map(answer, range(len(req.questions)), req.questions))
+
+    return BatchChatResponse(items=items, elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+
+@router.get("/stats")
+def chat_stats():
+    return {"coalescing": CHAT_FLIGHT.stats(), "speculation": SPECULATOR.stats(),
+            "model_scheduler": SCHEDULER.stats(), "tenants": TENANTS.stats()}
@@ -0,0 +1,161 @@
+from __future__ import annotations
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.schemas import DataQueryRequest
+from app.db import DatabaseClosed, UnknownTenant, database_for, list_tables, stream_select, use_tenant
+from app.tools import ensure_safe_sql
+
+VIEW = "chatbot_monthly_financials"
+# Keyset order; (period_month, account_id, category) is unique per row (ux_data_unique_row) and
+# idx_data_keyset serves it in index order, so pages neither scan nor sort the table
+KEY_COLUMNS = ["period_month", "account_id", "category"]
+
+_EQ_FILTERS = {"category": "category", "account": "account", "account_id": "account_id", "source": "source"}
+_RANGE_FILTERS = {"year": "year", "quarter": "quarter", "month": "month"}
+
+router = APIRouter(prefix="/data", tags=["data"])
+
+def _encode_cursor(state: Dict[str, Any]) -> str:
+    raw = json.dumps(state, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw)
+        if not isinstance(state, dict):
+            raise ValueError
+        return state
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def _query_fingerprint(req: DataQueryRequest) -> str:
+    # A cursor only resumes the query it was issued for
+    fields = req.model_dump(exclude={"cursor", "limit", "batch_size"})
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def _after_key(after: List[Any], params: Dict[str, Any]) -> str:
+    """Rows strictly after `after` in KEY_COLUMNS order, where SQLite sorts NULLs first."""
+    expr = None
+    for i in reversed(range(len(KEY_COLUMNS))):
+        col, value = KEY_COLUMNS[i], after[i]
+        params[f"k{i}"] = value
+        greater = f"{col} IS NOT NULL" if value is None else f"{col} > :k{i}"
+        expr = greater if expr is None else f"{greater} OR ({col} IS :k{i} AND ({expr}))"
+    if after[0] is not None:
+        # lets the index seek to the cursor instead of walking from the start
+        expr = f"{KEY_COLUMNS[0]} >= :k0 AND ({expr})"
+    return f"({expr})"
+
+def _filter_query(req: DataQueryRequest, after: List[Any] | None, limit: int | None) -> Tuple[str, Dict[str, Any]]:
+    where, params = [], {}
+    for field, col in _EQ_FILTERS.items():
+        value = getattr(req, field)
+        if value is not None:
+            where.append(f"{col} = :{field}")
+            params[field] = value.lower() if field == "category" else value
+    for field, col in _RANGE_FILTERS.items():
+        lo, hi = getattr(req, f"{field}_from"), getattr(req, f"{field}_to")
+        if lo is not None:
+            where.append(f"{col} >= :{field}_from")
+            params[f"{field}_from"] = lo
+        if hi is not None:
+            where.append(f"{col} <= :{field}_to")
+            params[f"{field}_to"] = hi
+
+    if after is not None:
+        where.append(_after_key(after, params))
+
+    sql = f"SELECT * FROM {VIEW}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # A single unpaged export needs no order and streams straight from the table
+    if limit is not None or after is not None:
+        sql += f" ORDER BY {', '.join(KEY_COLUMNS)}"
+    if limit is not None:
+        sql += " LIMIT :_limit"
+        params["_limit"] = limit
+    return sql, params
+
+def _sql_query(req: DataQueryRequest, offset: int, limit: int | None) -> Tuple[str, Dict[str, Any]]:
+    try:
+        safe = ensure_safe_sql(req.sql).strip().rstrip(";")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Arbitrary SELECTs have no known key, so resume by offset (add an ORDER BY for stable pages)
+    params = dict(req.named_params or {})
+    params.update({"_limit": -1 if limit is None else limit, "_offset": offset})
+    # newline before ")" so a trailing -- comment in the user's SQL cannot swallow it
+    return f"SELECT * FROM ({safe}\n) LIMIT :_limit OFFSET :_offset", params
+
+@router.post("/query")
+def query(req: DataQueryRequest):
+    """
+    Stream matching rows as NDJSON, one JSON object per line, read from the cursor in
+    `batch_size` batches. The last line is {"_rows": n, "_cursor": token-or-null}; pass the
+    token back as `cursor` to continue after `limit` rows.
+    """
+    try:
+        with use_tenant(req.tenant_id):
+            database = database_for(req.tenant_id)
+            allowed = set(list_tables(include_views=True, include_tables=False))
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    fingerprint = _query_fingerprint(req)
+    state = _decode_cursor(req.cursor) if req.cursor else {}
+    if state and state.get("q") != fingerprint:
+        raise HTTPException(status_code=400, detail="cursor does not belong to this query")
+
+    # Fetch one extra row to know whether another page exists
+    fetch = req.limit + 1 if req.limit is not None else None
+    if req.sql:
+        offset = int(state.get("offset", 0))
+        sql, params = _sql_query(req, offset, fetch)
+    else:
+        sql, params = _filter_query(req, state.get("after"), fetch)
+
+    if database.closed:
+        # evicted from the tenant LRU since it was resolved above
+        database = database_for(req.tenant_id)
+    rows = stream_select(sql, params, batch_size=req.batch_size, database=database, allowed_relations=allowed)
+    try:
+        # Surface SQL errors as a 400 before the 200 status line is sent
+        first = next(rows, None)
+    except DatabaseClosed as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def ndjson():
+        sent = 0
+        last = None
+        next_cursor = None
+        batch = first
+        while batch is not None:
+            cols, chunk = batch
+            lines = []
+            for r in chunk:
+                if req.limit is not None and sent == req.limit:
+                    if req.sql:
+                        next_cursor = _encode_cursor({"q": fingerprint, "offset": offset + sent})
+                    else:
+                        next_cursor = _encode_cursor({"q": fingerprint,
+                                                      "after": [last[c] for c in KEY_COLUMNS]})
+                    break
+                last = dict(zip(cols, r))
+                lines.append(json.dumps(last, default=str))
+                sent += 1
+            if lines:
+                yield "\n".join(lines) + "\n"
+            if next_cursor:
+                rows.close()
+                break
+            batch = next(rows, None)
+        yield json.dumps({"_rows": sent, "_cursor": next_cursor}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
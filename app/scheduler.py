@@ -0,0 +1,235 @@
+from __future__ import annotations
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Quotas of the OpenAI project (0 = not enforced locally)
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "0"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_BACKOFF_BASE_S = float(os.getenv("OPENAI_BACKOFF_BASE_S", "0.5"))
+OPENAI_BACKOFF_MAX_S = float(os.getenv("OPENAI_BACKOFF_MAX_S", "20"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_SPECULATIVE = 2
+
+# Longest a call may wait for admission before it is shed, per priority
+QUEUE_DEADLINES_S = {
+    PRIORITY_INTERACTIVE: float(os.getenv("OPENAI_QUEUE_DEADLINE_S", "15")),
+    PRIORITY_BATCH: float(os.getenv("OPENAI_BATCH_QUEUE_DEADLINE_S", "120")),
+    PRIORITY_SPECULATIVE: float(os.getenv("OPENAI_SPECULATIVE_QUEUE_DEADLINE_S", "2")),
+}
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a model call that could not start before its deadline."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"model calls are overloaded; retry in ~{retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to one minute's worth; a rate of 0 disables it."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units (capped at capacity) are available."""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.level
+        return max(deficit, 0.0) / self.rate
+
+    def take(self, amount: float, now: float):
+        if self.rate:
+            self._refill(now)
+            self.level -= amount
+
+    def refund(self, amount: float, now: float):
+        if self.rate:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def empty(self, now: float):
+        if self.rate:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+
+def _retry_after_s(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: BaseException) -> bool:
+    import openai
+    return isinstance(error, (openai.RateLimitError, openai.APITimeoutError,
+                              openai.APIConnectionError, openai.InternalServerError))
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    import openai
+    return isinstance(error, openai.RateLimitError)
+
+
+class ModelScheduler:
+    """
+    Process-wide admission control for model calls.
+
+    Calls wait in a priority queue (interactive before batch before speculative, FIFO within a
+    priority) until a concurrency slot and enough request/token budget are available. A call whose
+    estimated or actual queue wait exceeds its deadline is rejected with Overloaded. Retryable
+    failures are retried with full-jitter exponential backoff, honouring Retry-After (capped at
+    OPENAI_BACKOFF_MAX_S), and a 429 empties the buckets so the whole process backs off together.
+    The deadline covers the whole call: a retry that could not start before it raises Overloaded.
+    """
+
+    def __init__(self, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY, max_retries: int = OPENAI_MAX_RETRIES):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_retries = max_retries
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue: list = []  # heap of [priority, seq, est_tokens]
+        self._seq = itertools.count()
+        self._active = 0
+        self._avg_call_s = 2.0
+        self._stats = {"admitted": 0, "shed": 0, "retries": 0, "rate_limited": 0, "errors": 0}
+
+    def _estimate_wait(self, priority: int, est_tokens: int, now: float) -> float:
+        ahead = [e for e in self._queue if e[0] <= priority]
+        slots_wait = 0.0
+        backlog = self._active + len(ahead) + 1 - self.max_concurrency
+        if backlog > 0:
+            slots_wait = backlog / self.max_concurrency * self._avg_call_s
+        requests_wait = self._requests.wait_time(len(ahead) + 1, now)
+        tokens_wait = self._tokens.wait_time(sum(e[2] for e in ahead) + est_tokens, now)
+        return max(slots_wait, requests_wait, tokens_wait)
+
+    def _acquire(self, priority: int, est_tokens: int, deadline: float):
+        with self._cond:
+            now = time.monotonic()
+            estimate = self._estimate_wait(priority, est_tokens, now)
+            if now + estimate > deadline:
+                self._stats["shed"] += 1
+                raise Overloaded(retry_after=max(estimate, 1.0))
+
+            entry = [priority, next(self._seq), est_tokens]
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._queue[0] is entry and self._active < self.max_concurrency:
+                        wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(est_tokens, now))
+                        if wait <= 0:
+                            heapq.heappop(self._queue)
+                            self._requests.take(1, now)
+                            self._tokens.take(est_tokens, now)
+                            self._active += 1
+                            self._stats["admitted"] += 1
+                            # The next waiter may be admissible right away too
+                            self._cond.notify_all()
+                            return
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["shed"] += 1
+                        raise Overloaded(retry_after=max(self._estimate_wait(priority, est_tokens, now), 1.0))
+                    self._cond.wait(min(wait, remaining) if wait else remaining)
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                # The head may have changed; let the next waiter re-check
+                self._cond.notify_all()
+                raise
+
+    def _release(self, elapsed: float, est_tokens: int, actual_tokens: Optional[int], rate_limited: bool):
+        with self._cond:
+            now = time.monotonic()
+            self._active -= 1
+            self._avg_call_s = 0.8 * self._avg_call_s + 0.2 * elapsed
+            if rate_limited:
+                self._requests.empty(now)
+                self._tokens.empty(now)
+            elif actual_tokens is not None:
+                # Settle the estimate against what the call really used
+                self._tokens.refund(est_tokens - actual_tokens, now)
+            self._cond.notify_all()
+
+    def call(self, fn: Callable[[], Any], priority: int = PRIORITY_INTERACTIVE, est_tokens: int = 0,
+             tokens_used: Callable[[Any], Optional[int]] | None = None,
+             deadline_s: float | None = None) -> Any:
+        if deadline_s is None:
+            deadline_s = QUEUE_DEADLINES_S.get(priority, QUEUE_DEADLINES_S[PRIORITY_BATCH])
+        # One deadline for the whole call, retries included
+        deadline = time.monotonic() + deadline_s
+        attempt = 0
+        while True:
+            self._acquire(priority, est_tokens, deadline)
+            t0 = time.monotonic()
+            try:
+                resp = fn()
+            except Exception as e:
+                rate_limited = _is_rate_limit(e)
+                self._release(time.monotonic() - t0, est_tokens, None, rate_limited)
+                with self._cond:
+                    self._stats["rate_limited" if rate_limited else "errors"] += 1
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                # Full jitter, but never sooner than the server asked for (capped at OPENAI_BACKOFF_MAX_S)
+                backoff = random.uniform(0, min(OPENAI_BACKOFF_MAX_S, OPENAI_BACKOFF_BASE_S * 2 ** attempt))
+                backoff = max(backoff, min(_retry_after_s(e) or 0.0, OPENAI_BACKOFF_MAX_S))
+                if time.monotonic() + backoff > deadline:
+                    # Sleeping would overrun the caller's deadline; let it answer 503 now
+                    with self._cond:
+                        self._stats["shed"] += 1
+                    raise Overloaded(retry_after=max(backoff, 1.0)) from e
+                attempt += 1
+                with self._cond:
+                    self._stats["retries"] += 1
+                time.sleep(backoff)
+                continue
+            actual = None
+            if tokens_used is not None:
+                try:
+                    actual = tokens_used(resp)
+                except Exception:
+                    actual = None
+            self._release(time.monotonic() - t0, est_tokens, actual, False)
+            return resp
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out["queued"] = len(self._queue)
+            out["active"] = self._active
+            out["avg_call_ms"] = round(self._avg_call_s * 1000, 1)
+        return out
+
+
+SCHEDULER = ModelScheduler()
@@ -1,12 +1,59 @@
+import os
 from pydantic import BaseModel, Field
 from typing import Optional, List, Any, Dict
 
+# Most questions one /chat/batch request may carry; larger batches are rejected with 422
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+
 class ChatRequest(BaseModel):
     session_id: str = Field(..., description="Client-side conversation id")
     message: str
     context: Optional[Dict[str, Any]] = None
+    tenant_id: Optional[str] = Field(None, description="Selects the client database; falls back to context['tenant_id']")
 
 class ChatResponse(BaseModel):
     answer: str
     table_preview: Optional[List[Dict[str, Any]]] = None
     followups: Optional[List[str]] = None
+    trace_id: Optional[str] = None
+    profile: Optional[str] = Field(None, description="Directory of this request's profile under PROFILE_DIR, when one was captured")
+
+class BatchChatRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS,
+                                 description="Questions answered independently, in order (at most BATCH_MAX_QUESTIONS)")
+    context: Optional[Dict[str, Any]] = None
+    tenant_id: Optional[str] = Field(None, description="Selects the client database; falls back to context['tenant_id']")
+    max_parallel: Optional[int] = Field(None, ge=1, description="Capped by BATCH_MAX_PARALLEL")
+
+class BatchChatItem(BaseModel):
+    index: int
+    question: str
+    answer: Optional[str] = None
+    table_preview: Optional[List[Dict[str, Any]]] = None
+    followups: Optional[List[str]] = None
+    error: Optional[str] = None
+    elapsed_ms: float
+
+class BatchChatResponse(BaseModel):
+    items: List[BatchChatItem]
+    elapsed_ms: float
+
+class DataQueryRequest(BaseModel):
+    tenant_id: Optional[str] = None
+    # Filters over chatbot_monthly_financials (ignored when `sql` is given)
+    category: Optional[str] = None
+    account: Optional[str] = None
+    account_id: Optional[str] = None
+    source: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    quarter_from: Optional[int] = Field(None, ge=1, le=4)
+    quarter_to: Optional[int] = Field(None, ge=1, le=4)
+    month_from: Optional[int] = Field(None, ge=1, le=12)
+    month_to: Optional[int] = Field(None, ge=1, le=12)
+    # Or a read-only SELECT over the exposed views, with :named bindings
+    sql: Optional[str] = None
+    named_params: Optional[Dict[str, Any]] = None
+    cursor: Optional[str] = Field(None, description="Resume token from a previous response's trailer line")
+    limit: Optional[int] = Field(None, ge=1, description="Max rows in this response; omit to stream everything")
+    batch_size: int = Field(500, ge=1, le=10000)
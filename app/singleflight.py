@@ -0,0 +1,99 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List
+
+COALESCE_ENABLED = os.getenv("CHAT_COALESCE", "1") == "1"
+# How long a follower waits on the leader before running its own execution
+COALESCE_WAIT_S = float(os.getenv("CHAT_COALESCE_WAIT_S", "60"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WS_RE.sub(" ", (text or "").strip()).casefold()
+
+
+def request_key(message: str, context: Dict[str, Any] | None, history: List[Dict[str, str]],
+                tenant_id: str | None = None) -> str:
+    """Fingerprint of (tenant, normalized message, context, prior history) used to share executions."""
+    payload = {
+        "tenant": tenant_id,
+        "message": _normalize(message),
+        "context": context or {},
+        "history": [[m.get("role"), _normalize(m.get("content", ""))] for m in history],
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one execution of `fn`.
+    The first caller (leader) runs it; the others wait up to `wait_s` for its
+    result and fall back to running `fn` themselves if the leader is too slow.
+    """
+
+    def __init__(self, wait_s: float = COALESCE_WAIT_S):
+        self.wait_s = wait_s
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {"requests": 0, "executions": 0, "coalesced": 0, "wait_timeouts": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._stats["requests"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+            else:
+                call.followers += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result
+
+        if not call.done.wait(self.wait_s):
+            with self._lock:
+                self._stats["wait_timeouts"] += 1
+                self._stats["executions"] += 1
+            return fn()
+
+        with self._lock:
+            self._stats["coalesced"] += 1
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._calls)
+        out["coalescing_ratio"] = round(out["coalesced"] / out["requests"], 4) if out["requests"] else 0.0
+        return out
+
+
+CHAT_FLIGHT = SingleFlight()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from app.answer_cache import ANSWER_CACHE
+from app.llm import run_agent
+from app.scheduler import PRIORITY_SPECULATIVE
+from app.singleflight import SingleFlight, request_key
+from app.storage import get_history
+
+SPECULATE_ENABLED = os.getenv("SPECULATE_FOLLOWUPS", "0") == "1"
+SPECULATE_MAX_FOLLOWUPS = int(os.getenv("SPECULATE_MAX_FOLLOWUPS", "2"))
+SPECULATE_CONCURRENCY = int(os.getenv("SPECULATE_CONCURRENCY", "2"))
+# Total tokens speculative runs may spend per rolling hour (0 = unlimited)
+SPECULATE_TOKEN_BUDGET = int(os.getenv("SPECULATE_TOKENS_PER_HOUR", "200000"))
+
+_BUDGET_WINDOW_S = 3600.0
+
+# Speculative runs only coalesce with each other. /chat never joins one (it would wait on
+# PRIORITY_SPECULATIVE model calls); it takes what a finished run left in ANSWER_CACHE
+SPECULATIVE_FLIGHT = SingleFlight()
+
+
+class FollowupSpeculator:
+    """
+    Pre-answers suggested followups in the background and parks the results in the
+    answer cache under the key the followup click will compute. Work is bounded by a
+    worker pool, a cap on queued jobs and a rolling hourly token budget.
+    """
+
+    def __init__(self, concurrency: int = SPECULATE_CONCURRENCY, token_budget: int = SPECULATE_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._pool = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="speculate")
+        # Never queue more than one extra job per worker; drop the rest
+        self._slots = threading.BoundedSemaphore(max(concurrency, 1) * 2)
+        self._lock = threading.Lock()
+        self._spent: deque[tuple[float, int]] = deque()
+        self._stats = {"scheduled": 0, "skipped_busy": 0, "skipped_budget": 0,
+                       "completed": 0, "failed": 0, "tokens_spent": 0}
+
+    def _tokens_in_window(self, now: float) -> int:
+        while self._spent and self._spent[0][0] <= now - _BUDGET_WINDOW_S:
+            self._spent.popleft()
+        return sum(t for _, t in self._spent)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def schedule(self, session_id: str, followups: List[str], context: Dict[str, Any] | None,
+                 tenant_id: str | None = None):
+        """Queue up to SPECULATE_MAX_FOLLOWUPS followups of the turn that was just stored for `session_id`."""
+        prior = get_history(session_id, tenant_id)
+        for question in (followups or [])[:SPECULATE_MAX_FOLLOWUPS]:
+            if not isinstance(question, str) or not question.strip():
+                continue
+            with self._lock:
+                over_budget = self.token_budget and self._tokens_in_window(time.monotonic()) >= self.token_budget
+            if over_budget:
+                self._count("skipped_budget")
+                continue
+            if not self._slots.acquire(blocking=False):
+                self._count("skipped_busy")
+                continue
+            self._count("scheduled")
+            self._pool.submit(self._run, question, dict(context or {}), list(prior), tenant_id)
+
+    def _run(self, question: str, context: Dict[str, Any], prior: List[Dict[str, str]], tenant_id: str | None):
+        key = request_key(question, context, prior, tenant_id)
+        try:
+            def execute():
+                result = run_agent(prior + [{"role": "user", "content": question}], context=dict(context),
+                                   priority=PRIORITY_SPECULATIVE, tenant_id=tenant_id)
+                tokens = (result.get("usage") or {}).get("total") or 0
+                with self._lock:
+                    self._spent.append((time.monotonic(), tokens))
+                    self._stats["tokens_spent"] += tokens
+                ANSWER_CACHE.put(key, result, tokens=tokens)
+                return result
+
+            SPECULATIVE_FLIGHT.do(key, execute)
+            self._count("completed")
+        except Exception:
+            self._count("failed")
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["tokens_last_hour"] = self._tokens_in_window(time.monotonic())
+        # Runs that joined an identical speculative run in flight stored nothing of their own
+        out["coalesced"] = SPECULATIVE_FLIGHT.stats()["coalesced"]
+        cache = ANSWER_CACHE.stats()
+        for name in ("stored", "hits", "superseded", "superseded_tokens", "wasted", "wasted_tokens"):
+            out[name] = cache[name]
+        # Share of stored answers a followup click was served from
+        out["hit_rate"] = round(cache["hits"] / cache["stored"], 4) if cache["stored"] else 0.0
+        return out
+
+
+SPECULATOR = FollowupSpeculator()
@@ -1,12 +1,13 @@
 from __future__ import annotations
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
 
-# In-memory store; swap with DB table if you want persistence
-CONVOS: dict[str, List[Dict[str, str]]] = defaultdict(list)
+# In-memory store; swap with DB table if you want persistence.
+# Keyed by (tenant_id, session_id): session ids are client-generated and may collide across tenants
+CONVOS: dict[Tuple[Optional[str], str], List[Dict[str, str]]] = defaultdict(list)
 
-def add_message(session_id: str, role: str, content: str):
-    CONVOS[session_id].append({"role": role, "content": content})
+def add_message(session_id: str, role: str, content: str, tenant_id: str | None = None):
+    CONVOS[(tenant_id, session_id)].append({"role": role, "content": content})
 
-def get_history(session_id: str) -> List[Dict[str, str]]:
-    return CONVOS.get(session_id, [])[-20:]  # last 20 turns
+def get_history(session_id: str, tenant_id: str | None = None) -> List[Dict[str, str]]:
+    return CONVOS.get((tenant_id, session_id), [])[-20:]  # last 20 turns
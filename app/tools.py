@@ -1,9 +1,8 @@
 from __future__ import annotations
 import os
 import re
-import sqlparse
 from typing import Any, Dict, List
-from .db import list_tables, describe_table, run_select
+from .db import list_tables, describe_table, run_select, search_accounts
 
 MAX_ROWS = int(os.getenv("MAX_ROWS", "1000"))
 
@@ -16,6 +15,7 @@ def ensure_safe_sql(sql: str) -> str:
         raise ValueError("Multiple SQL statements are not allowed.")
     if DANGEROUS.search(sql):
         raise ValueError("Only read-only SELECT queries are allowed.")
+    import sqlparse  # deferred: only needed once the model actually runs SQL
     parsed = sqlparse.parse(sql)
     if not parsed or parsed[0].get_type().upper() != "SELECT":
         raise ValueError("Only SELECT queries are allowed.")
@@ -43,6 +43,14 @@ def tool_distinct_values(table_name: str, column: str, limit: int = 100):
     sql = f'SELECT DISTINCT "{safe_col}" AS value FROM "{safe_table}" WHERE "{safe_col}" IS NOT NULL ORDER BY 1 LIMIT :lim'
     return run_select(sql, {"lim": limit})
 
+def tool_search_accounts(query: str, limit: int = 10) -> Dict[str, Any]:
+    return {"query": query, "matches": search_accounts(query, max(1, min(int(limit), 50)))}
+
+def discover_schema() -> Dict[str, Any]:
+    """Snapshot of tool_list_tables + tool_describe_table for every listed table, shareable across agent runs."""
+    tables = tool_list_tables()
+    return {"tables": tables, "describe": {t: tool_describe_table(t) for t in tables["tables"]}}
+
 # JSON schemas for tool calling
 tool_schemas = [
     {
@@ -105,5 +113,18 @@ tool_schemas = [
             }
         }
     },
+    {
+        "type": "function",
+        "name": "tool_search_accounts",
+        "description": "Find the accounts a user refers to (e.g. 'payroll', 'office rent'). Returns the best matches with their exact account, account_ids, category and source values.",
+        "parameters": {
+            "type": "object",
+            "required": ["query"],
+            "properties": {
+                "query": {"type": "string"},
+                "limit": {"type": "integer", "minimum": 1, "maximum": 50, "default": 10}
+            }
+        }
+    },
 ]
 
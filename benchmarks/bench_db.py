@@ -0,0 +1,158 @@
+"""
+DB-layer microbenchmarks per data scale.
+
+Builds (or reuses) scaled synthetic databases with db_setup_module/synthesize.py, then times
+each tool function and the canonical aggregate queries the agent runs against them. Output
+mirrors pytest-benchmark's columns (min / max / mean / stddev / median / rounds / ops).
+
+Usage (from the repo root):
+    python benchmarks/bench_db.py --scales 1 10 100
+    python benchmarks/bench_db.py --scales 1 100 1000 --dir /tmp/kudwa-bench --json bench.json
+    python benchmarks/bench_db.py --scales 100 --layout star
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP_DIR = os.path.join(ROOT, "db_setup_module")
+
+VIEW = "chatbot_monthly_financials"
+
+# The questions from the system prompt, as the SQL the agent typically writes for them
+CANONICAL_QUERIES = {
+    "profit_by_quarter": (
+        f"SELECT quarter, SUM(CASE WHEN category IN ('revenue', 'non_operating_revenue') THEN amount ELSE -amount END) AS profit "
+        f"FROM {VIEW} WHERE year = :year GROUP BY quarter ORDER BY quarter",
+        {"year": 2024},
+    ),
+    "revenue_trend_monthly": (
+        f"SELECT period_month, SUM(amount) AS revenue FROM {VIEW} "
+        f"WHERE category = 'revenue' AND year = :year GROUP BY period_month ORDER BY period_month",
+        {"year": 2024},
+    ),
+    "expense_category_growth": (
+        f"SELECT category, SUM(CASE WHEN year = :year THEN amount ELSE 0 END) - "
+        f"SUM(CASE WHEN year = :year - 1 THEN amount ELSE 0 END) AS increase FROM {VIEW} "
+        f"WHERE category LIKE '%expenses%' AND year IN (:year, :year - 1) GROUP BY category ORDER BY increase DESC",
+        {"year": 2024},
+    ),
+    "compare_q1_q2": (
+        f"SELECT quarter, category, SUM(amount) AS total FROM {VIEW} "
+        f"WHERE year = :year AND quarter IN (1, 2) GROUP BY quarter, category",
+        {"year": 2024},
+    ),
+    "top_expense_accounts": (
+        f"SELECT account, SUM(amount) AS total FROM {VIEW} WHERE category = 'operating_expenses' "
+        f"AND year = :year GROUP BY account ORDER BY total DESC LIMIT 10",
+        {"year": 2024},
+    ),
+}
+
+
+def db_name(scale: int, layout: str) -> str:
+    return f"scale_{scale}" if layout == "wide" else f"scale_{scale}_{layout}"
+
+
+def ensure_db(directory: str, scale: int, rebuild: bool, layout: str = "wide") -> str:
+    path = os.path.join(directory, f"{db_name(scale, layout)}.db")
+    if rebuild or not os.path.exists(path):
+        sys.path.insert(0, SETUP_DIR)
+        from synthesize import write_scaled
+        t0 = time.perf_counter()
+        rows = write_scaled(os.path.join(ROOT, "data.db"), path, scale, layout=layout)
+        print(f"built {path}: {rows} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return path
+
+
+def bench(fn, min_time: float, max_rounds: int, min_rounds: int = 3) -> dict:
+    fn()  # warm caches the way a long-running server would have them
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_rounds and (len(times) < min_rounds or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    mean = statistics.fmean(times)
+    return {
+        "min_ms": min(times) * 1000,
+        "max_ms": max(times) * 1000,
+        "mean_ms": mean * 1000,
+        "stddev_ms": (statistics.stdev(times) if len(times) > 1 else 0.0) * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "rounds": len(times),
+        "ops": 1.0 / mean if mean else float("inf"),
+    }
+
+
+def cases():
+    from app import tools
+    from app.db import stream_select
+
+    def drain_view():
+        for _ in stream_select(f"SELECT * FROM {VIEW}", batch_size=1000):
+            pass
+
+    out = {
+        "tool_list_tables": lambda: tools.tool_list_tables(),
+        "tool_describe_table": lambda: tools.tool_describe_table(VIEW),
+        "tool_sample_rows": lambda: tools.tool_sample_rows(VIEW, 5),
+        "tool_distinct_values[data.account]": lambda: tools.tool_distinct_values("data", "account", 1000),
+        "tool_distinct_values[view.category]": lambda: tools.tool_distinct_values(VIEW, "category", 100),
+        "stream_view_full": drain_view,
+    }
+    for name, (sql, params) in CANONICAL_QUERIES.items():
+        out[f"tool_run_sql[{name}]"] = (lambda s=sql, p=params: tools.tool_run_sql(s, dict(p)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time DB-layer tool functions per synthetic data scale.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--dir", default=os.path.join(ROOT, "benchmarks", ".data"),
+                        help="where scaled databases are built and reused")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate databases even if present")
+    parser.add_argument("--layout", choices=["wide", "star"], default="wide",
+                        help="ingest layout of the generated databases (see data_manager.write_to_sql)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent per case")
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--only", default=None, help="substring filter on case names")
+    parser.add_argument("--json", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    for scale in args.scales:
+        ensure_db(args.dir, scale, args.rebuild, args.layout)
+
+    # Each scale is served as a tenant, so the regular DB layer (pool, caches, DB_MODE) is measured
+    os.environ["TENANT_DB_DIR"] = args.dir
+    os.environ.setdefault("MAX_ROWS", "1000")
+    sys.path.insert(0, ROOT)
+    from app.db import use_tenant
+
+    results = {}
+    header = f"{'case':<44}{'scale':>7}{'min':>10}{'median':>10}{'mean':>10}{'stddev':>10}{'rounds':>8}{'ops':>10}"
+    print(header)
+    print("-" * len(header))
+    for scale in args.scales:
+        with use_tenant(db_name(scale, args.layout)):
+            for name, fn in cases().items():
+                if args.only and args.only not in name:
+                    continue
+                r = bench(fn, args.min_time, args.max_rounds)
+                results.setdefault(name, {})[scale] = r
+                print(f"{name:<44}{scale:>7}{r['min_ms']:>10.3f}{r['median_ms']:>10.3f}{r['mean_ms']:>10.3f}"
+                      f"{r['stddev_ms']:>10.3f}{r['rounds']:>8}{r['ops']:>10.1f}")
+    print("(times in ms)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Cold-start benchmark: import time of app.main, process spawn to first healthy
+response, and (with --chat) the first /chat answer.
+
+Usage (from the repo root):
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --runs 3 --chat   # needs a real OPENAI_API_KEY
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def _env(**extra):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.update(extra)
+    return env
+
+
+def import_time() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=_env(),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int = 10):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=ROOT,
+                         env=_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # Nested imports are indented and already counted in their parent's cumulative time
+        if name[1:].startswith(" "):
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(rows, reverse=True)[:top]]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str, timeout: float = 1.0):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return resp.status
+
+
+def _post(url: str, payload: dict, timeout: float = 120.0):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.status
+
+
+def server_run(chat: bool, warmup: bool) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=_env(WARMUP="1" if warmup else "0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                if _get(base + "/health") == 200:
+                    break
+            except OSError:
+                time.sleep(0.02)
+        out = {"ready_s": time.perf_counter() - t0}
+        if chat:
+            t1 = time.perf_counter()
+            _post(base + "/chat", {"session_id": "cold-start-bench", "message": "What was total revenue in 2024?"})
+            out["first_chat_s"] = time.perf_counter() - t1
+            out["spawn_to_answer_s"] = time.perf_counter() - t0
+        return out
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _summary(values):
+    return {"median": round(statistics.median(values), 4), "min": round(min(values), 4),
+            "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency of the API.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--chat", action="store_true", help="also time the first /chat answer")
+    parser.add_argument("--no-warmup", action="store_true", help="start the server with WARMUP=0")
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    servers = [server_run(args.chat, warmup=not args.no_warmup) for _ in range(args.runs)]
+
+    report = {"import_app_main_s": _summary(imports), "slowest_imports": slowest_imports()}
+    for key in servers[0]:
+        report[key] = _summary([s[key] for s in servers])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import json
 import re
@@ -277,58 +278,293 @@ def flatten_rootfi(records: list, value_mode: str = "leaf") -> pd.DataFrame:
     return df
 
 
+def _period_columns(df, period_start):
+    # canonical period month + handy dims, as compact dtypes
+    period = period_start.dt
+    df["year_month_text"] = period.to_period("M").astype(str).astype("category")  # e.g., "2020-01"
+    df["year"] = period.year.astype("Int16")
+    df["month"] = period.month.astype("Int8")
+    df["quarter"] = period.quarter.astype("Int8")
+
+
 def process_data(df1):
+    # one filtered copy; every step after it works in place on that copy
+    df1 = df1.loc[df1['period_end'].notna(), [c for c in df1.columns if c != 'period_key']]
     df1['value'] = df1['value'].abs()
-    df1 = df1.dropna(subset='period_end')
     df1['period_start'] = pd.to_datetime(df1['period_start'])
     df1['period_end'] = pd.to_datetime(df1['period_end'])
+    _period_columns(df1, df1['period_start'])
 
-    # canonical period month
-    df1["year_month_text"] = df1["period_start"].dt.to_period("M").astype(str)  # e.g., "2020-01"
-    df1 = df1.drop('period_key', axis=1)
-    # handy dims (optional)
-    df1["year"] = df1["period_start"].dt.year.astype("Int64")
-    df1["month"] = df1["period_start"].dt.month.astype("Int64")
-    df1["quarter"] = df1["period_start"].dt.quarter.astype("Int64")
-
-    df1['account'] = df1['account'].str.replace(r'_\d+$', '', regex=True)
-    df1['source'] = 'quickbooks'
+    df1['account'] = df1['account'].str.replace(r'_\d+$', '', regex=True).astype('category')
+    if 'category' in df1.columns:
+        df1['category'] = df1['category'].astype('category')
+    df1['source'] = pd.Categorical(['quickbooks'] * len(df1))
 
     return df1
 
 
-def process_rootfi_file(df_rootfi):
-    df_rootfi = df_rootfi[df_rootfi['parent_uid'].str.match(r'^[A-Za-z0-9_]+:/[^/].*$', na=False)]
-    df_rootfi['account'] = df_rootfi['path'].str.split('/', n=1).str[1]
-    df_rootfi['account'] = (
-        df_rootfi['account']
+def _rootfi_rows(df_rootfi, columns):
+    keep = df_rootfi['parent_uid'].str.match(r'^[A-Za-z0-9_]+:/[^/].*$', na=False)
+    # copy only the columns used, not the whole flattened frame
+    return df_rootfi.loc[keep, columns]
+
+
+def _rootfi_account(path):
+    return (
+        path.str.split('/', n=1).str[1]
         .str.lower()
         .str.replace(r'[^a-z0-9]+', '_', regex=True)
         .str.strip('_')
     )
 
-    df_rootfi = df_rootfi.rename(columns={
-        'section': 'category',
-        'element_id': 'account_id',
-        'reported_value': 'value',
+
+def process_rootfi_file(df_rootfi):
+    rows = _rootfi_rows(df_rootfi, ['path', 'element_id', 'period_start', 'period_end', 'reported_value', 'section'])
+    account = _rootfi_account(rows['path'])
+    df_rootfi = pd.DataFrame({
+        'account': account.astype('category'),
+        'account_id': rows['element_id'],
+        'period_start': rows['period_start'],
+        'period_end': rows['period_end'],
+        'value': rows['reported_value'],
+        'category': rows['section'].astype('category'),
     })
+    _period_columns(df_rootfi, df_rootfi['period_start'])
+    df_rootfi['source'] = pd.Categorical(['rootfi'] * len(df_rootfi))
+    return df_rootfi
 
-    df_rootfi["year_month_text"] = df_rootfi["period_start"].dt.to_period("M").astype(str)  # e.g., "2020-01"
-    df_rootfi["year"] = df_rootfi["period_start"].dt.year.astype("Int64")
-    df_rootfi["month"] = df_rootfi["period_start"].dt.month.astype("Int64")
-    df_rootfi["quarter"] = df_rootfi["period_start"].dt.quarter.astype("Int64")
 
-    df_rootfi['source'] = 'rootfi'
-    df_rootfi = df_rootfi[['account', 'account_id', 'period_start', 'period_end', 'value', 'category',
-                           'year_month_text', 'year', 'month', 'quarter', 'source']]
-    return df_rootfi
+def rootfi_account_terms(df_rootfi):
+    """
+    Subcategory path of every account process_rootfi_file produces, e.g. account 'rent_co' ->
+    'operating expenses > Opex > Rent & Co', as extra search terms for index_accounts.
+    """
+    rows = _rootfi_rows(df_rootfi, ['path', 'section'])
+    return pd.DataFrame({
+        'account': _rootfi_account(rows['path']),
+        'terms': rows['section'].str.replace('_', ' ') + ' > ' + rows['path'].str.replace('/', ' > '),
+    }).drop_duplicates()
+
+
+CHATBOT_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS chatbot_monthly_financials AS
+SELECT
+  account,
+  account_id,
+  period_start,
+  period_end,
+  value        AS amount,
+  LOWER(category) AS category,
+  year_month_text AS period_month,
+  year,
+  month,
+  quarter,
+  source
+FROM data"""
+
+BASE_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_data_account_month ON data(account_id, year, month)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_data_unique_row ON data(account_id, category, year_month_text)",
+    # keyset order of /data/query filter pages (period_month, account_id, category on the view)
+    "CREATE INDEX IF NOT EXISTS idx_data_keyset ON data(year_month_text, account_id, lower(category))",
+]
+
+
+# Star layout: the repeated text of the wide table lives once in dimension tables and the fact
+# table holds integer keys. `data` becomes a view with the wide table's columns, so
+# chatbot_monthly_financials (and every query written against `data`) is unchanged.
+STAR_TABLES_SQL = [
+    "CREATE TABLE IF NOT EXISTS sources (source_id INTEGER PRIMARY KEY, source TEXT)",
+    "CREATE TABLE IF NOT EXISTS categories (category_id INTEGER PRIMARY KEY, category TEXT)",
+    "CREATE TABLE IF NOT EXISTS accounts (account_key INTEGER PRIMARY KEY, account TEXT, account_id TEXT, "
+    "source_id INTEGER REFERENCES sources(source_id))",
+    "CREATE TABLE IF NOT EXISTS periods (period_id INTEGER PRIMARY KEY, period_start TEXT, period_end TEXT, "
+    "year_month_text TEXT, year INTEGER, month INTEGER, quarter INTEGER)",
+    "CREATE TABLE IF NOT EXISTS facts (account_key INTEGER NOT NULL REFERENCES accounts(account_key), "
+    "category_id INTEGER NOT NULL REFERENCES categories(category_id), "
+    "period_id INTEGER NOT NULL REFERENCES periods(period_id), value REAL)",
+]
+
+DATA_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS data AS
+SELECT
+  (SELECT a.account FROM accounts a WHERE a.account_key = f.account_key) AS account,
+  (SELECT a.account_id FROM accounts a WHERE a.account_key = f.account_key) AS account_id,
+  p.period_start,
+  p.period_end,
+  f.value,
+  c.category,
+  p.year_month_text,
+  p.year,
+  p.month,
+  p.quarter,
+  (SELECT s.source FROM accounts a JOIN sources s ON s.source_id = a.source_id
+   WHERE a.account_key = f.account_key) AS source
+FROM facts f
+JOIN periods p    ON p.period_id = f.period_id
+JOIN categories c ON c.category_id = f.category_id"""
+
+STAR_INDEXES_SQL = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_accounts_key ON accounts(account, account_id, source_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_periods_key ON periods(period_start, period_end)",
+    "CREATE INDEX IF NOT EXISTS idx_periods_year_month ON periods(year, month)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_facts_row ON facts(account_key, category_id, period_id)",
+    # covering for the per-period / per-category aggregates the chatbot runs
+    "CREATE INDEX IF NOT EXISTS idx_facts_period_category ON facts(period_id, category_id, value)",
+]
+
+STAR_TABLES = ["facts", "accounts", "periods", "categories", "sources"]
+
+
+def _drop_existing(con):
+    """Drop whichever layout (wide `data` table or star schema) the database currently holds."""
+    con.execute("DROP VIEW IF EXISTS chatbot_monthly_financials")
+    con.execute("DROP TABLE IF EXISTS account_search")
+    kind = con.execute("SELECT type FROM sqlite_schema WHERE name = 'data'").fetchone()
+    if kind:
+        con.execute(f"DROP {kind[0].upper()} data")
+    for table in STAR_TABLES:
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _as_sql_text(col):
+    # the same text to_sql writes for datetimes, so dimension keys compare equal across chunks
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.strftime('%Y-%m-%d %H:%M:%S')
+    return col
+
+
+def _encode(con, table, id_col, keys, extra=None):
+    """
+    Dictionary-encode the rows of `keys` against `table`: distinct key tuples already stored keep
+    their id, new ones are appended (with the `extra` columns of their first row). Returns the id
+    of every row.
+    """
+    codes = keys.groupby(list(keys.columns), dropna=False, sort=False, observed=True).ngroup().to_numpy()
+    first = np.unique(codes, return_index=True)[1]
+    uniques = keys.iloc[first].reset_index(drop=True)
+    if extra is not None:
+        uniques = pd.concat([uniques, extra.iloc[first].reset_index(drop=True)], axis=1)
+    uniques = uniques.astype(object).where(uniques.notna(), None)
+
+    known = {tuple(r[1:]): r[0] for r in con.execute(f"SELECT {id_col}, {', '.join(keys.columns)} FROM {table}")}
+    next_id = max(known.values(), default=0) + 1
+    ids = np.empty(len(uniques), dtype=np.int64)
+    new = []
+    for i, key in enumerate(uniques[list(keys.columns)].itertuples(index=False, name=None)):
+        found = known.get(key)
+        if found is None:
+            found = next_id
+            next_id += 1
+            new.append(i)
+        ids[i] = found
+    if new:
+        rows = uniques.iloc[new]
+        rows.insert(0, id_col, ids[new])
+        rows.to_sql(table, con, if_exists="append", index=False)
+    return ids[codes]
+
+
+def _write_star(df, con):
+    source_id = _encode(con, "sources", "source_id", pd.DataFrame({"source": df["source"]}))
+    account_key = _encode(con, "accounts", "account_key", pd.DataFrame({
+        "account": df["account"], "account_id": df["account_id"], "source_id": source_id}, index=df.index))
+    category_id = _encode(con, "categories", "category_id", pd.DataFrame({"category": df["category"]}))
+    period_id = _encode(
+        con, "periods", "period_id",
+        pd.DataFrame({"period_start": _as_sql_text(df["period_start"]), "period_end": _as_sql_text(df["period_end"])}),
+        extra=df[["year_month_text", "year", "month", "quarter"]],
+    )
+    pd.DataFrame({
+        "account_key": account_key,
+        "category_id": category_id,
+        "period_id": period_id,
+        "value": df["value"].to_numpy(),
+    }).to_sql("facts", con, if_exists="append", index=False)
 
 
-def write_to_sql(df):
-    import sqlite3
-    con = sqlite3.connect("../data.db")
+# Entity lookup for the chatbot's tool_search_accounts (app/db.py search_accounts)
+ACCOUNT_SEARCH_SQL = """
+CREATE VIRTUAL TABLE account_search USING fts5(
+  account, terms, account_ids UNINDEXED, category UNINDEXED, source UNINDEXED,
+  tokenize = 'trigram'
+)"""
+
+
+def _words(text):
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def index_accounts(con, account_terms=None):
+    """
+    Rebuild the account_search FTS5 (trigram) index: one row per account, category and source in
+    `data` (with its comma-separated account ids), searchable by its name, the name as words (aliases) and any `account_terms` (DataFrame of
+    account/terms, e.g. rootfi_account_terms()).
+    """
+    accounts = pd.read_sql(
+        "SELECT account, GROUP_CONCAT(DISTINCT account_id) AS account_ids, LOWER(category) AS category, source "
+        "FROM data WHERE account IS NOT NULL GROUP BY account, LOWER(category), source", con)
+    extra = {}
+    if account_terms is not None:
+        extra = account_terms.dropna().groupby('account')['terms'].agg(' | '.join).to_dict()
+    accounts['terms'] = [' | '.join(filter(None, (_words(a), extra.get(a)))) for a in accounts['account']]
+
+    con.execute("DROP TABLE IF EXISTS account_search")
+    con.execute(ACCOUNT_SEARCH_SQL)
+    con.executemany(
+        "INSERT INTO account_search (account, terms, account_ids, category, source) VALUES (?, ?, ?, ?, ?)",
+        accounts[['account', 'terms', 'account_ids', 'category', 'source']].itertuples(index=False, name=None))
+    con.commit()
+
+
+def write_to_sql(df, db_path="../data.db", index_log=None, max_indexes=3, if_exists="replace", finalize=True,
+                 layout="wide", account_terms=None):
+    """
+    Replace the `data` table, recreate the chatbot view and base indexes, and optionally
+    add the indexes recommended by index_advisor for the sql_exec workload in `index_log`.
+
+    Large loads can be written in chunks: if_exists="append" with finalize=False for all
+    but the last chunk, so the indexes are built once at the end.
+
+    Finalizing also builds the account_search index (see index_accounts), with the extra
+    search terms in `account_terms`.
 
-    df.to_sql("data", con, if_exists="replace", index=False)
+    layout="star" writes dimension tables (accounts, categories, sources, periods) and an
+    integer-keyed `facts` table instead, with `data` as a view over them. The index advisor
+    only targets the wide table, so index_log is rejected there.
+    """
+    import sqlite3
+    if layout not in ("wide", "star"):
+        raise ValueError(f"unknown layout {layout!r}")
+    if layout == "star" and index_log:
+        raise ValueError("index_log is only supported with layout='wide'")
+    con = sqlite3.connect(db_path)
+    try:
+        if if_exists == "replace":
+            _drop_existing(con)
+        if layout == "star":
+            for stmt in STAR_TABLES_SQL:
+                con.execute(stmt)
+            _write_star(df, con)
+        else:
+            df.to_sql("data", con, if_exists=if_exists, index=False)
+        con.commit()
+        if not finalize:
+            return
+        if layout == "star":
+            con.execute(DATA_VIEW_SQL)
+        con.execute(CHATBOT_VIEW_SQL)
+        for stmt in (STAR_INDEXES_SQL if layout == "star" else BASE_INDEXES_SQL):
+            con.execute(stmt)
+        con.commit()
+        index_accounts(con, account_terms)
+
+        if index_log:
+            from index_advisor import advise, load_workload, apply_indexes
+            report = advise(db_path, load_workload(index_log), top=max_indexes)
+            apply_indexes(con, report["recommendations"])
+    finally:
+        con.close()
 
 
 def read_from_sqlite(query):
@@ -0,0 +1,309 @@
+"""
+Offline index advisor driven by the SQL the chatbot actually runs.
+
+Reads the `sql_exec` events that app/llm.py emits (LOG_LLM=1 + LLM_LOG_FILE),
+replays them with EXPLAIN QUERY PLAN against a copy of the database, tries a
+handful of candidate (covering) indexes on the `data` table and ranks them by
+the query time they save across the logged workload.
+
+Usage (from db_setup_module/):
+    python index_advisor.py --log ../logs/llm.jsonl --db ../data.db
+    python index_advisor.py --log ../logs/llm.jsonl --db ../data.db --top 2 --apply
+"""
+import argparse
+import json
+import re
+import sqlite3
+import time
+from collections import Counter
+
+BASE_TABLE = "data"
+MAX_INDEX_COLUMNS = 6
+TIMING_REPEATS = 3
+# An index must save at least this much, absolutely and as a share of the baseline time of the
+# queries it serves; smaller "savings" are timing noise (the baseline already uses existing indexes)
+MIN_BENEFIT_MS = 1.0
+MIN_BENEFIT_RATIO = 0.2
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_CLAUSE_END_RE = r"(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bHAVING\b|\bLIMIT\b|\bUNION\b|\)|$)"
+_WHERE_RE = re.compile(r"\bWHERE\b(.*?)" + _CLAUSE_END_RE, re.IGNORECASE | re.DOTALL)
+_GROUP_BY_RE = re.compile(r"\bGROUP\s+BY\b(.*?)(?=\bORDER\s+BY\b|\bHAVING\b|\bLIMIT\b|\)|$)",
+                          re.IGNORECASE | re.DOTALL)
+
+
+def load_workload(log_path):
+    """
+    Collect the distinct (sql, params) pairs from `sql_exec` events with their frequency.
+    Non-JSON lines and other event kinds are ignored.
+    """
+    counts = Counter()
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            try:
+                evt = json.loads(line)
+            except ValueError:
+                continue
+            if evt.get('kind') != 'sql_exec' or not evt.get('sql'):
+                continue
+            params = json.dumps(evt.get('params') or {}, sort_keys=True, default=str)
+            counts[(evt['sql'].strip(), params)] += 1
+    return [(sql, json.loads(params), n) for (sql, params), n in counts.most_common()]
+
+
+def _split_select_list(select_list):
+    items, depth, cur = [], 0, []
+    for ch in select_list:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            items.append(''.join(cur).strip())
+            cur = []
+        else:
+            cur.append(ch)
+    if cur:
+        items.append(''.join(cur).strip())
+    return items
+
+
+def column_maps(con):
+    """
+    For the base table and every view over it, map each column name the model can
+    reference to the expression it resolves to on the base table, e.g. 'category' ->
+    'lower(category)' for chatbot_monthly_financials.
+    """
+    maps = {BASE_TABLE: {}}
+    for row in con.execute(f'PRAGMA table_info("{BASE_TABLE}")'):
+        maps[BASE_TABLE][row[1].lower()] = row[1]
+
+    views = con.execute("SELECT name, sql FROM sqlite_schema WHERE type = 'view'").fetchall()
+    for view_name, view_sql in views:
+        m = re.search(r"\bSELECT\b(.*)\bFROM\s+\"?" + BASE_TABLE + r"\"?\s*$", view_sql or '',
+                      re.IGNORECASE | re.DOTALL)
+        if not m:
+            continue
+        mapping = {}
+        for item in _split_select_list(m.group(1)):
+            am = re.match(r"(.+?)\s+AS\s+\"?(\w+)\"?$", item, re.IGNORECASE | re.DOTALL)
+            expr, alias = (am.group(1).strip(), am.group(2)) if am else (item, item)
+            # Only keep aliases that resolve to a plain column or lower(column)
+            em = re.fullmatch(r"(?:(lower)\s*\(\s*(\w+)\s*\)|(\w+))", expr, re.IGNORECASE)
+            if not em:
+                continue
+            mapping[alias.lower()] = em.group(3) or f"lower({em.group(2)})"
+        maps[view_name] = mapping
+    return maps
+
+
+def _mapping_for(sql, maps):
+    # Views the query reads from take precedence over same-named base columns
+    mapping = {}
+    for relation in sorted(maps, key=lambda r: r != BASE_TABLE):
+        if re.search(r"\b" + re.escape(relation) + r"\b", sql, re.IGNORECASE):
+            mapping.update(maps[relation])
+    return mapping
+
+
+def _referenced(text, mapping, pattern):
+    found = []
+    for name, base in mapping.items():
+        if re.search(r"\b" + re.escape(name) + r"\b" + pattern, text, re.IGNORECASE):
+            if base not in found:
+                found.append(base)
+    return found
+
+
+def candidate_indexes(sql, mapping, distinct_counts):
+    """
+    Build index candidates for one query: equality columns (most selective first),
+    then one range column, then GROUP BY columns; plus a covering variant that also
+    carries every other referenced column.
+    """
+    text = _STRING_LITERAL_RE.sub("''", sql)
+    where = ' '.join(m.group(1) for m in _WHERE_RE.finditer(text))
+    group_by = ' '.join(m.group(1) for m in _GROUP_BY_RE.finditer(text))
+
+    eq_cols = _referenced(where, mapping, r"\s*(?:==?|\bIN\b|\bIS\b)")
+    eq_cols.sort(key=lambda c: -distinct_counts.get(c, 0))
+    range_cols = [c for c in _referenced(where, mapping, r"\s*(?:<|>|\bBETWEEN\b)") if c not in eq_cols]
+    group_cols = [c for c in _referenced(group_by, mapping, "") if c not in eq_cols + range_cols[:1]]
+    all_cols = _referenced(text, mapping, "")
+
+    key = eq_cols + range_cols[:1]
+    if not key:
+        return []
+    out = [tuple(key[:MAX_INDEX_COLUMNS])]
+    with_group = (key + group_cols)[:MAX_INDEX_COLUMNS]
+    if len(with_group) > len(key):
+        out.append(tuple(with_group))
+    covering = with_group + [c for c in all_cols if c not in with_group]
+    if len(covering) <= MAX_INDEX_COLUMNS and len(covering) > len(with_group):
+        out.append(tuple(covering))
+    return out
+
+
+def index_name(columns):
+    parts = [re.sub(r"\W+", "_", c).strip("_").lower() for c in columns]
+    return "idx_advisor_" + "_".join(parts)
+
+
+def _normalize_column(expr):
+    expr = re.sub(r"\s+(ASC|DESC)\s*$", "", expr.strip(), flags=re.IGNORECASE)
+    return re.sub(r"\s+", "", expr).lower()
+
+
+def _existing_index_columns(con):
+    """
+    Key columns of every index on the base table, normalized. Expression columns such as
+    lower(category) (PRAGMA index_info reports them as None) are read from the index's SQL.
+    """
+    existing = []
+    rows = con.execute("SELECT name, sql FROM sqlite_schema WHERE type = 'index' AND tbl_name = ?",
+                       (BASE_TABLE,)).fetchall()
+    for name, sql in rows:
+        cols = [r[2] for r in con.execute(f'PRAGMA index_info("{name}")')]
+        if None in cols:
+            if not sql:
+                continue
+            body = sql[sql.index("(", re.search(r"\bON\b", sql, re.IGNORECASE).end()) + 1:]
+            body = re.split(r"\)\s*(?:WHERE\b.*)?$", body, flags=re.IGNORECASE | re.DOTALL)[0]
+            cols = _split_select_list(body)
+        existing.append(tuple(_normalize_column(c) for c in cols))
+    return existing
+
+
+def _plan(con, sql, params):
+    return [r[3] for r in con.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def _time_query(con, sql, params):
+    best = None
+    for _ in range(TIMING_REPEATS):
+        t0 = time.perf_counter()
+        con.execute(sql, params).fetchall()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def advise(db_path, workload, top=None, min_benefit_ms=MIN_BENEFIT_MS, min_benefit_ratio=MIN_BENEFIT_RATIO):
+    """
+    Replay the workload against an in-memory copy of `db_path` and return candidate
+    indexes ranked by estimated benefit (seconds saved across the logged frequency).
+    Candidates below the benefit floor are dropped.
+    """
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    con = sqlite3.connect(":memory:")
+    src.backup(con)
+    src.close()
+
+    kind = con.execute("SELECT type FROM sqlite_schema WHERE name = ?", (BASE_TABLE,)).fetchone()
+    if not kind or kind[0] != "table":
+        # star layout (data_manager.write_to_sql(layout="star")): `data` is a view and cannot be indexed
+        raise ValueError(f"`{BASE_TABLE}` is not a table in {db_path}; the advisor only supports the wide layout")
+
+    maps = column_maps(con)
+    distinct_counts = {}
+    for base in {b for m in maps.values() for b in m.values()}:
+        distinct_counts[base] = con.execute(f"SELECT COUNT(DISTINCT {base}) FROM {BASE_TABLE}").fetchone()[0]
+    existing = _existing_index_columns(con)
+    existing_names = {r[0] for r in con.execute("SELECT name FROM sqlite_schema WHERE type = 'index'")}
+
+    # Baseline: skip anything that no longer runs (schema drift, missing params, ...)
+    queries = []
+    skipped = 0
+    for sql, params, freq in workload:
+        try:
+            plan = _plan(con, sql, params)
+            base_t = _time_query(con, sql, params)
+        except sqlite3.Error:
+            skipped += 1
+            continue
+        queries.append({"sql": sql, "params": params, "freq": freq, "plan": plan, "time": base_t})
+
+    candidates = []
+    for q in queries:
+        mapping = _mapping_for(q["sql"], maps)
+        for cols in candidate_indexes(q["sql"], mapping, distinct_counts):
+            if cols in candidates:
+                continue
+            key = tuple(_normalize_column(c) for c in cols)
+            if any(ex[:len(key)] == key for ex in existing):
+                continue
+            if index_name(cols) in existing_names:
+                continue
+            candidates.append(cols)
+
+    ranked = []
+    for cols in candidates:
+        name = index_name(cols)
+        con.execute(f"CREATE INDEX {name} ON {BASE_TABLE}({', '.join(cols)})")
+        benefit = 0.0
+        baseline = 0.0
+        used_by = 0
+        for q in queries:
+            plan = _plan(con, q["sql"], q["params"])
+            if not any(name in step for step in plan):
+                continue
+            used_by += q["freq"]
+            baseline += q["time"] * q["freq"]
+            saved = q["time"] - _time_query(con, q["sql"], q["params"])
+            benefit += max(saved, 0.0) * q["freq"]
+        con.execute(f"DROP INDEX {name}")
+        if used_by and benefit * 1000 >= max(min_benefit_ms, min_benefit_ratio * baseline * 1000):
+            ranked.append({"name": name, "columns": list(cols), "queries": used_by,
+                           "benefit_ms": round(benefit * 1000, 3)})
+
+    con.close()
+    ranked.sort(key=lambda r: (-r["benefit_ms"], -r["queries"], len(r["columns"])))
+
+    # Keep one index per column prefix: a better-ranked index already serves the same lookups
+    chosen = []
+    for r in ranked:
+        n = len(r["columns"])
+        if any(c["columns"][:n] == r["columns"] or r["columns"][:len(c["columns"])] == c["columns"]
+               for c in chosen):
+            continue
+        chosen.append(r)
+    if top is not None:
+        chosen = chosen[:top]
+    return {"queries": len(queries), "skipped": skipped, "recommendations": chosen}
+
+
+def apply_indexes(con, recommendations):
+    for r in recommendations:
+        con.execute(f"CREATE INDEX IF NOT EXISTS {r['name']} ON {BASE_TABLE}({', '.join(r['columns'])})")
+    con.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend indexes on `data` from logged sql_exec events.")
+    parser.add_argument("--log", required=True, help="JSON-lines log written via LLM_LOG_FILE")
+    parser.add_argument("--db", default="../data.db")
+    parser.add_argument("--top", type=int, default=None, help="keep only the N best recommendations")
+    parser.add_argument("--min-benefit-ms", type=float, default=MIN_BENEFIT_MS,
+                        help="drop indexes saving less than this across the workload")
+    parser.add_argument("--min-benefit-ratio", type=float, default=MIN_BENEFIT_RATIO,
+                        help="drop indexes saving less than this share of their queries' baseline time")
+    parser.add_argument("--apply", action="store_true", help="create the recommended indexes in --db")
+    args = parser.parse_args()
+
+    report = advise(args.db, load_workload(args.log), top=args.top,
+                    min_benefit_ms=args.min_benefit_ms, min_benefit_ratio=args.min_benefit_ratio)
+    print(json.dumps(report, indent=2))
+
+    if args.apply and report["recommendations"]:
+        con = sqlite3.connect(args.db)
+        try:
+            apply_indexes(con, report["recommendations"])
+        finally:
+            con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Synthetic data scaler: writes a statistically similar copy of the `data` table at N times
+its size through the regular write path (data_manager.write_to_sql).
+
+Each scale replica clones every account (same source, category and monthly periods) under a
+new account/account_id, and draws its values from a log-normal distribution fitted to that
+account's real amounts, with the same share of negative, zero and missing values. Replica 0 keeps the
+original names, so 1x is a resampled copy of the source.
+
+Usage (from db_setup_module/):
+    python synthesize.py --scale 100 --out ../data_x100.db
+    python synthesize.py --scale 100 --out ../data_x100_star.db --layout star
+"""
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from data_manager import write_to_sql
+
+COLUMNS = ['account', 'account_id', 'period_start', 'period_end', 'value', 'category',
+           'year_month_text', 'year', 'month', 'quarter', 'source']
+# Rows written per to_sql call
+CHUNK_ROWS = 500_000
+
+
+def load_source(db_path):
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql(f"SELECT {', '.join(COLUMNS)} FROM data", con)
+    finally:
+        con.close()
+
+
+def fit_accounts(df):
+    """
+    Per-account value distribution: log-normal fit of the non-zero magnitudes, and the share of
+    negative, zero and missing values.
+    """
+    keys = ['source', 'category', 'account_id']
+    amounts = df['value'].abs()
+    logs = np.log(amounts.where(amounts > 0))
+    grouped = [df[k] for k in keys]
+    stats = pd.DataFrame({
+        'log_mean': logs.groupby(grouped, dropna=False).mean(),
+        'log_std': logs.groupby(grouped, dropna=False).std(),
+        'zero_frac': (amounts == 0).groupby(grouped, dropna=False).sum()
+                     / amounts.notna().groupby(grouped, dropna=False).sum(),
+        'null_frac': df['value'].isna().groupby(grouped, dropna=False).mean(),
+        # among the non-zero amounts
+        'neg_frac': (df['value'] < 0).groupby(grouped, dropna=False).sum()
+                    / (amounts > 0).groupby(grouped, dropna=False).sum(),
+    })
+    stats['log_std'] = stats['log_std'].fillna(0.1)
+    # Accounts with no non-zero amount only ever produce zeros (or nulls)
+    stats['zero_frac'] = stats['zero_frac'].where(stats['log_mean'].notna(), 1.0).fillna(0.0)
+    stats['log_mean'] = stats['log_mean'].fillna(0.0)
+    stats['neg_frac'] = stats['neg_frac'].fillna(0.0)
+    return stats.reset_index()
+
+
+def synthesize(df, scale, seed=0):
+    """Yield DataFrame chunks that together hold `scale` replicas of `df`."""
+    rng = np.random.default_rng(seed)
+    base = df.merge(fit_accounts(df), on=['source', 'category', 'account_id'], how='left')
+    per_chunk = max(1, CHUNK_ROWS // max(len(base), 1))
+
+    for first in range(0, scale, per_chunk):
+        replicas = range(first, min(first + per_chunk, scale))
+        parts = []
+        for k in replicas:
+            part = base[COLUMNS].copy()
+            if k:
+                part['account'] = part['account'] + f'_s{k}'
+                part['account_id'] = part['account_id'].astype(str) + f'-s{k}'
+            values = np.exp(rng.normal(base['log_mean'].to_numpy(), base['log_std'].to_numpy())).round(2)
+            values[rng.random(len(base)) < base['neg_frac'].to_numpy()] *= -1
+            values[rng.random(len(base)) < base['zero_frac'].to_numpy()] = 0.0
+            values[rng.random(len(base)) < base['null_frac'].to_numpy()] = np.nan
+            part['value'] = values
+            parts.append(part)
+        yield pd.concat(parts, ignore_index=True)
+
+
+def write_scaled(src_db, out_db, scale, seed=0, layout="wide"):
+    df = load_source(src_db)
+    chunks = list(range(0, scale, max(1, CHUNK_ROWS // max(len(df), 1))))
+    total = 0
+    for i, chunk in enumerate(synthesize(df, scale, seed)):
+        write_to_sql(chunk, out_db, if_exists="replace" if i == 0 else "append",
+                     finalize=i == len(chunks) - 1, layout=layout)
+        total += len(chunk)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a scaled synthetic copy of the data table.")
+    parser.add_argument("--src", default="../data.db")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--scale", type=int, default=10, help="size multiplier, e.g. 10 to 10000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", choices=["wide", "star"], default="wide")
+    args = parser.parse_args()
+    rows = write_scaled(args.src, args.out, args.scale, args.seed, args.layout)
+    print(f"wrote {rows} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()